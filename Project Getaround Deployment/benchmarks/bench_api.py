@@ -0,0 +1,169 @@
+"""
+Load test of the API: latency percentiles and throughput per endpoint.
+
+The app runs in-process through httpx's ASGI transport by default, under
+gunicorn + UvicornWorker with `--gunicorn`, or is reached at `--url`.
+
+commande : python benchmarks/bench_api.py [--gunicorn | --url URL] [--requests 500] [--concurrency 10] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+import httpx
+import numpy as np
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastapi")
+
+with open(os.path.join(API_DIR, "test.json")) as f:
+    FEATURES = json.load(f)
+
+# name: (method, path, request arguments)
+SCENARIOS = {
+    "prediction": ("POST", "/prediction", {"json": FEATURES}),
+    "prediction_batch_100": ("POST", "/prediction/batch", {"json": [FEATURES] * 100}),
+    "preview": ("GET", "/preview", {"params": {"n_rows": 5}}),
+    "unique_values": ("GET", "/unique-values", {"params": {"column": "model_key"}}),
+    "quantile": ("GET", "/quantile", {"params": {"column": "mileage", "percent": 0.1}}),
+    "quantile_page": ("GET", "/quantile", {"params": {"column": "mileage", "percent": 0.5, "limit": 100}}),
+    "filter_by": ("POST", "/filter-by", {"json": {"column": "model_key", "by_category": ["Peugeot"]}}),
+    "groupby": ("POST", "/groupby", {"json": {"column": "model_key", "by_method": "mean"}}),
+}
+
+
+async def run_scenario(client, method, path, kwargs, n_requests, concurrency):
+    latencies, errors = [], 0
+    remaining = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "rps": n_requests / elapsed,
+        "errors": errors,
+    }
+
+
+async def run_all(client, scenarios, n_requests, concurrency, warmup):
+    results = {}
+    for name in scenarios:
+        method, path, kwargs = SCENARIOS[name]
+        for _ in range(warmup):
+            await client.request(method, path, **kwargs)
+        results[name] = await run_scenario(client, method, path, kwargs, n_requests, concurrency)
+        r = results[name]
+        print(f"{name:<22}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['rps']:>10.1f}{r['errors']:>8}")
+    return results
+
+
+async def in_process(args):
+    sys.path.insert(0, API_DIR)
+    os.chdir(API_DIR)
+    import api
+
+    # ASGITransport does not run the lifespan, so enter it here (model, dataset, batcher)
+    async with api.app.router.lifespan_context(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_all(client, args.scenarios, args.requests, args.concurrency, args.warmup)
+
+
+async def remote(args, url):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await run_all(client, args.scenarios, args.requests, args.concurrency, args.warmup)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    process = subprocess.Popen(
+        ["gunicorn", "api:app", "--config", "gunicorn.conf.py"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            if httpx.get(f"{url}/model/status").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark an already running server")
+    target.add_argument("--gunicorn", action="store_true", help="start gunicorn with UvicornWorker")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="requests per scenario before measuring")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    print(f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>10}{'errors':>8}")
+    if args.gunicorn:
+        process, url = start_gunicorn(args.workers)
+        try:
+            results = asyncio.run(remote(args, url))
+        finally:
+            process.terminate()
+            process.wait()
+        mode = f"gunicorn x{args.workers}"
+    elif args.url:
+        results = asyncio.run(remote(args, args.url))
+        mode = args.url
+    else:
+        results = asyncio.run(in_process(args))
+        mode = "in-process"
+
+    if output:
+        meta = {
+            "benchmark": "api",
+            "mode": mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.time(),
+        }
+        with open(output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
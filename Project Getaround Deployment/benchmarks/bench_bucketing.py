@@ -0,0 +1,73 @@
+"""
+Row-by-row `Series.apply` bucketing (previous dashboard code) against the vectorized
+version in `streamlit/analysis.py`, on the delay dataset and on a synthetic copy.
+
+commande : python benchmarks/bench_bucketing.py [--rows 10000000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+STREAMLIT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit")
+sys.path.insert(0, STREAMLIT_DIR)
+
+import analysis
+from data_cache import load_cached, read_delay_analysis
+
+
+def apply_late(minutes):
+    return minutes.apply(lambda x : "on time" if x <= 0 else 'late' if x > 0 else 'NA')
+
+def apply_delay(minutes):
+    return minutes.apply(lambda x : "on time" if x < 0 else 'late -30min' if x < 30
+                         else 'late -1h' if x < 60 else 'late -2h' if x < 120
+                         else 'late -4h' if x < 240 else 'late +4h' if x>= 240 else 'NA')
+
+def apply_enough_delta(delta):
+    return delta.apply(lambda x: 'yes' if x >=0 else 'no')
+
+
+def best_time(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def compare(name, minutes, repeat):
+    print(f"\n{name}: {len(minutes):,} rows")
+    print(f"{'column':<14}{'apply (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for column, legacy, vectorized in [
+        ("late", apply_late, analysis.lateness),
+        ("delay", apply_delay, analysis.delay_bucket),
+        ("enough_delta", apply_enough_delta, analysis.enough_delta),
+    ]:
+        legacy_time, expected = best_time(legacy, minutes, repeat)
+        vectorized_time, result = best_time(vectorized, minutes, repeat)
+        assert (result.astype(str) == expected).all(), f"{column}: results differ"
+        print(f"{column:<14}{legacy_time:>12.4f}{vectorized_time:>16.4f}{legacy_time / vectorized_time:>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="rows of the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = load_cached(os.path.join(STREAMLIT_DIR, "get_around_delay_analysis.xlsx"), read_delay_analysis)
+    minutes = data["delay_at_checkout_in_minutes"]
+    compare("delay dataset", minutes, args.repeat)
+
+    # Same distribution (missing values included), resampled to the requested size
+    rng = np.random.default_rng(0)
+    synthetic = pd.Series(rng.choice(minutes.to_numpy(), size=args.rows))
+    compare("synthetic dataset", synthetic, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Micro-benchmarks: model loading, single-row and N-row inference, dataset
+loading, and the dashboard analysis functions run headless.
+
+commande : python benchmarks/bench_micro.py [--repeat 20] [--rows 1000] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib.util
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+API_DIR = os.path.join(ROOT, "fastapi")
+DASHBOARD_DIR = os.path.join(ROOT, "streamlit")
+
+
+def load_module(name, path):
+    """
+    Import a module by path. Both apps have a `data_cache` module, so they cannot share sys.path.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        "repeat": repeat,
+        "mean_ms": timings.mean(),
+        "min_ms": timings.min(),
+        "p50_ms": np.percentile(timings, 50),
+        "p95_ms": np.percentile(timings, 95),
+    }
+
+
+def api_benchmarks(repeat, n_rows):
+    sys.path.insert(0, API_DIR)
+    import joblib
+    from dataset import read_pricing_csv
+    from data_cache import load_cached
+    from fast_inference import FastPredictor, load_artifact
+
+    model_path = os.path.join(API_DIR, "model.joblib")
+    artifact_path = os.path.join(API_DIR, "model.ubj")
+    csv_path = os.path.join(API_DIR, "get_around_pricing_project.csv")
+    with open(os.path.join(API_DIR, "test.json")) as f:
+        features = json.load(f)
+
+    pipeline = joblib.load(model_path)
+    fast = FastPredictor.from_pipeline(pipeline)
+    one_row = pd.DataFrame(features, index=[0])
+    rows = read_pricing_csv(csv_path).drop(columns="rental_price_per_day").sample(n_rows, replace=True, random_state=0)
+    records = rows.to_dict(orient="records")
+    load_cached(csv_path, read_pricing_csv)
+
+    return {
+        "model_load_joblib": lambda: joblib.load(model_path),
+        "model_load_artifact": lambda: load_artifact(artifact_path),
+        "predict_1_row_pipeline": lambda: pipeline.predict(one_row),
+        "predict_1_row_fast": lambda: fast.predict_one(features),
+        f"predict_{n_rows}_rows_pipeline": lambda: pipeline.predict(rows),
+        f"predict_{n_rows}_rows_fast": lambda: fast.predict_many(records),
+        "pricing_csv_read": lambda: read_pricing_csv(csv_path),
+        "pricing_parquet_load": lambda: load_cached(csv_path, read_pricing_csv),
+    }
+
+
+def dashboard_benchmarks(repeat):
+    analysis = load_module("analysis", os.path.join(DASHBOARD_DIR, "analysis.py"))
+    dashboard_cache = load_module("dashboard_data_cache", os.path.join(DASHBOARD_DIR, "data_cache.py"))
+    xlsx_path = os.path.join(DASHBOARD_DIR, "get_around_delay_analysis.xlsx")
+
+    raw = dashboard_cache.load_cached(xlsx_path, dashboard_cache.read_delay_analysis)
+    data = analysis.add_delay_columns(raw)
+    cancel = analysis.canceled_with_previous(data)
+    late_drivers = analysis.late_drivers(data)
+    delta = analysis.delta_frame(data)
+    chain_index = analysis.RentalChainIndex(data)
+    thresholds = np.arange(0, 721, 15)
+
+    return {
+        "delay_xlsx_read": lambda: dashboard_cache.read_delay_analysis(xlsx_path),
+        "delay_parquet_load": lambda: dashboard_cache.load_cached(xlsx_path, dashboard_cache.read_delay_analysis),
+        "add_delay_columns": lambda: analysis.add_delay_columns(raw),
+        "overview": lambda: analysis.overview(data),
+        "canceled_with_previous": lambda: analysis.canceled_with_previous(data),
+        "late_drivers": lambda: analysis.late_drivers(data),
+        "delta_frame": lambda: analysis.delta_frame(data),
+        "chart_data": lambda: analysis.chart_data(data, cancel, late_drivers, delta),
+        "rental_chain_index": lambda: analysis.RentalChainIndex(data),
+        "simulate_49_thresholds": lambda: chain_index.simulate(thresholds, "All cars"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1000, help="rows of the N-row inference benchmarks")
+    parser.add_argument("--only", nargs="+", choices=["api", "dashboard"], default=["api", "dashboard"])
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    benchmarks = {}
+    if "api" in args.only:
+        benchmarks.update(api_benchmarks(args.repeat, args.rows))
+    if "dashboard" in args.only:
+        benchmarks.update(dashboard_benchmarks(args.repeat))
+
+    print(f"{'benchmark':<30}{'mean ms':>10}{'min ms':>10}{'p95 ms':>10}")
+    results = {}
+    for name, function in benchmarks.items():
+        function()
+        results[name] = measure(function, args.repeat)
+        r = results[name]
+        print(f"{name:<30}{r['mean_ms']:>10.3f}{r['min_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+    if args.output:
+        meta = {
+            "benchmark": "micro",
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.time(),
+        }
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
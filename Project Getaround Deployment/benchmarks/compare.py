@@ -0,0 +1,52 @@
+"""
+Compare benchmark results against a saved baseline and flag regressions.
+
+Latencies (`*_ms`) regress when they grow, throughput (`rps`) when it drops,
+by more than `--tolerance` (relative).
+
+commande : python benchmarks/compare.py baseline.json results.json [--tolerance 0.2]
+"""
+import sys
+import json
+import argparse
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(baseline, current, tolerance):
+    rows, regressions = [], 0
+    for name, metrics in current.items():
+        if name not in baseline:
+            continue
+        for metric, value in metrics.items():
+            if not (metric.endswith("_ms") or metric == "rps") or metric not in baseline[name]:
+                continue
+            before = baseline[name][metric]
+            change = (value - before) / before if before else 0.0
+            regressed = change > tolerance if metric.endswith("_ms") else change < -tolerance
+            regressions += regressed
+            rows.append((name, metric, before, value, change, regressed))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rows, regressions = compare(load_results(args.baseline), load_results(args.current), args.tolerance)
+    print(f"{'benchmark':<30}{'metric':<10}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, metric, before, value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<30}{metric:<10}{before:>12.3f}{value:>12.3f}{change:>+10.1%}{flag}")
+    print(f"\n{regressions} regression(s) over {args.tolerance:.0%} tolerance")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
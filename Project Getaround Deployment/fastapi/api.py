@@ -1,11 +1,23 @@
+import os
+import time
+import asyncio
+import functools
 import uvicorn
 import pandas as pd 
-import joblib
 import json
-import mlflow
-from pydantic import BaseModel
-from typing import Literal, List, Union
-from fastapi import FastAPI, File, UploadFile
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ValidationError
+from typing import Literal, List, Union, Any, Optional
+from collections import Counter
+from fastapi import FastAPI, File, UploadFile, Body, HTTPException, Query, Depends, Request
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+
+from model_registry import ModelRegistry
+from dataset import PricingDataset
+from prediction_cache import make_prediction_cache
+from executor import BoundedExecutor, ExecutorOverloaded, parse_timeouts
+import metrics
+from metrics import stage
 
 
 description = """
@@ -20,6 +32,13 @@ Where you can:
 ## Prediction
 Where you can: 
 * `/prediction` of daily rental price of a car with machine learning.
+* `/prediction/batch` of many cars at once, as a JSON list or a CSV file.
+* `/model/status` to check which model version is served.
+
+## Monitoring
+Where you can:
+* `/executor` check the load of the thread pool running the heavy requests.
+* `/metrics` get request, stage timing, cache and memory metrics in Prometheus format.
 
 Check out documentation for more information on each endpoint. 
 """
@@ -44,17 +63,202 @@ tags_metadata = [
     {
         "name": "Prediction",
         "description": "Prediction of daily rental price of a car with machine learning"
+    },
+    {
+        "name": "Monitoring",
+        "description": "Metrics and profiling of the running workers"
     }
 ]
 
 
+# Model is loaded once per process (before fork with gunicorn --preload)
+# and hot-reloaded when the file changes on disk.
+registry = ModelRegistry(
+    # Unset: models/LATEST once train.py wrote it, else the compact artifact (model.ubj), else the pickled pipeline
+    path=os.environ.get("MODEL_PATH"),
+    poll_interval=float(os.environ.get("MODEL_POLL_SECONDS", 5)),
+)
+
+# Pricing data shared by the analytics endpoints
+dataset = PricingDataset(os.environ.get("DATASET_PATH", "get_around_pricing_project.csv"))
+
+# Prediction cache: "memory" (per worker), "sqlite" (shared by the workers through a local file) or "off"
+prediction_cache = make_prediction_cache(
+    os.environ.get("PREDICTION_CACHE", "off"),
+    path=os.environ.get("PREDICTION_CACHE_PATH", "/tmp/getaround_predictions.sqlite"),
+    maxsize=int(os.environ.get("PREDICTION_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL", 3600)),
+    # Round mileage to this many km in the cache key and the prediction (0: exact mileage)
+    mileage_step=float(os.environ.get("PREDICTION_CACHE_MILEAGE_STEP", 0)),
+)
+
+# Thread pool running the blocking pandas and model work of the handlers
+executor = BoundedExecutor(
+    max_workers=int(os.environ.get("EXECUTOR_THREADS", 4)),
+    # Jobs waiting for a thread before answering 503
+    max_queue=int(os.environ.get("EXECUTOR_MAX_QUEUE", 32)),
+    # Per endpoint, e.g. "groupby=2,quantile=5,prediction_batch=20" (seconds), else EXECUTOR_TIMEOUT
+    timeouts=parse_timeouts(os.environ.get("EXECUTOR_TIMEOUTS", "")),
+    default_timeout=float(os.environ.get("EXECUTOR_TIMEOUT", 30)),
+)
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", 1))
+
+# Own small pool for the file I/O of the sqlite prediction cache, so that it
+# neither takes slots of the handlers nor is skipped when they are busy
+cache_executor = BoundedExecutor(
+    max_workers=int(os.environ.get("PREDICTION_CACHE_THREADS", 2)),
+    max_queue=int(os.environ.get("PREDICTION_CACHE_MAX_QUEUE", 256)),
+    default_timeout=float(os.environ.get("PREDICTION_CACHE_TIMEOUT", 1)),
+) if prediction_cache is not None and prediction_cache.blocking else None
+
+# Allow starting the sampling profiler through /debug/profiler
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+
+# Rows serialized at a time by streaming responses
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 1000))
+
+# Maximum number of rows accepted by the batch endpoints
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 10000))
+
+# Opt-in server-side micro-batching of concurrent /prediction requests
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "0") == "1"
+MICRO_BATCH_WINDOW_MS = float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2))
+MICRO_BATCH_MAX_ROWS = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 64))
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-row predictions for up to `window` seconds
+    (or `max_rows` rows), score them with one vectorized call through
+    `run(function, rows)` and hand each caller its own result.
+    """
+
+    def __init__(self, predict_fn, window, max_rows, run):
+        self.predict_fn = predict_fn
+        self.run = run
+        self.window = window
+        self.max_rows = max_rows
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = Counter()
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _predict(self, rows):
+        try:
+            return self.predict_fn(rows)
+        except Exception:
+            # One bad row must not fail the others: score rows one by one
+            results = []
+            for row in rows:
+                try:
+                    results.append(self.predict_fn([row])[0])
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+            try:
+                results = await self.run(self._predict, rows)
+            except Exception as e:
+                # Executor busy or too slow: the whole batch fails with it
+                results = [e] * len(batch)
+            self.batches += 1
+            self.rows += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    # Caller went away
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "window_ms": self.window * 1000,
+            "max_rows": self.max_rows,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+def predict_records(rows):
+    return registry.get().predict_many(rows, FEATURE_COLUMNS)
+
+batcher = MicroBatcher(
+    predict_records, MICRO_BATCH_WINDOW_MS / 1000, MICRO_BATCH_MAX_ROWS, functools.partial(executor.run, "prediction"),
+) if MICRO_BATCHING else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.ensure_loaded()
+    dataset.load()
+    watcher = asyncio.create_task(registry.watch(functools.partial(executor.run, "model_reload")))
+    if batcher is not None:
+        batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    watcher.cancel()
+    executor.shutdown()
+    if cache_executor is not None:
+        cache_executor.shutdown()
+
+
 app = FastAPI(
     title="🚗 Getaround API",
     description=description,
     version="1.0",
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+def record_parsing(request, handler):
+    """
+    Time from the request arrival to the handler: body reading and Pydantic validation.
+    """
+    metrics.STAGE_LATENCY.observe(handler, "parse_and_validate", value=time.perf_counter() - request.state.start)
+
 class GroupBy(BaseModel):
     column: str = "model_key"
     by_method: Literal["mean", "median", "max", "min", "sum", "count"] = "mean"
@@ -78,6 +282,179 @@ class PredictionFeatures(BaseModel):
     has_speed_regulator: bool = True
     winter_tires: bool = True
 
+# Feature columns, in the order of the model input
+FEATURE_COLUMNS = list(PredictionFeatures.model_fields)
+
+
+class Page(BaseModel):
+    limit: Optional[int] = None
+    offset: int = 0
+    columns: Optional[List[str]] = None
+    format: Literal["json", "ndjson", "csv"] = "json"
+
+    def is_default(self):
+        return self.limit is None and self.offset == 0 and self.columns is None and self.format == "json"
+
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    columns: Optional[List[str]] = Query(None),
+    format: Literal["json", "ndjson", "csv"] = "json",
+):
+    return Page(limit=limit, offset=offset, columns=columns, format=format)
+
+
+def serialize_chunk(data, positions, columns, format, header):
+    chunk = data.iloc[positions]
+    if columns is not None:
+        chunk = chunk[columns]
+    if format == "csv":
+        return chunk.to_csv(header=header)
+    return chunk.reset_index().to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n"
+
+
+async def stream_rows(endpoint, data, positions, columns, format):
+    """
+    Select and serialize the rows at `positions` chunk by chunk, so memory does not grow with the result size.
+    Each chunk is serialized in the executor, with the timeout of `endpoint`.
+    """
+    for start in range(0, len(positions), STREAM_CHUNK_ROWS):
+        yield await executor.run_admitted(
+            endpoint, serialize_chunk, data, positions[start:start + STREAM_CHUNK_ROWS], columns, format, start == 0,
+        )
+
+
+def rows_response(endpoint, data, positions, page):
+    """
+    Page of the rows at `positions`, restricted to `page.columns`:
+    * `json`: `{"total", "offset", "limit", "next_offset", "data": [records]}`
+    * `ndjson` or `csv`: streamed rows, total number of rows in `X-Total-Count` header.
+    """
+    if page.columns is not None:
+        unknown = [column for column in page.columns if column not in data.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {unknown}")
+    total = len(positions)
+    end = total if page.limit is None else min(page.offset + page.limit, total)
+    positions = positions[page.offset:end]
+    headers = {"X-Total-Count": str(total)}
+
+    if page.format == "json":
+        rows = data.iloc[positions]
+        if page.columns is not None:
+            rows = rows[page.columns]
+        next_offset = end if end < total else None
+        content = (
+            f'{{"total":{total},"offset":{page.offset},"limit":{json.dumps(page.limit)},'
+            f'"next_offset":{json.dumps(next_offset)},"data":{rows.reset_index().to_json(orient="records")}}}'
+        )
+        return Response(content=content, media_type="application/json", headers=headers)
+    media_type = "text/csv" if page.format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_rows(endpoint, data, positions, page.columns, page.format), media_type=media_type, headers=headers)
+
+
+async def cached(function, *args):
+    """
+    Prediction cache call, in its own pool when the backend does file I/O.
+    The cache is optional: a busy pool skips it (None, like a miss) instead of answering 503.
+    """
+    if not prediction_cache.blocking:
+        return function(*args)
+    try:
+        return await cache_executor.run("prediction_cache", function, *args)
+    except (ExecutorOverloaded, asyncio.TimeoutError):
+        prediction_cache.skipped += 1
+        return None
+
+async def guarded(endpoint, awaitable, pool=executor):
+    """
+    Await work of `pool`: 503 when its queue is full, 504 past the endpoint timeout.
+    """
+    try:
+        return await awaitable
+    except ExecutorOverloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, retry later.", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Request took more than {pool.timeout(endpoint)} seconds.")
+
+async def offload(endpoint, function, *args):
+    """
+    Run a blocking handler body in the executor.
+    """
+    return await guarded(endpoint, executor.run(endpoint, function, *args))
+
+async def current_index(endpoint):
+    """
+    Index of the dataset, reloaded in the executor when the file changed.
+    """
+    if dataset.is_stale():
+        return await offload(endpoint, dataset.get_index)
+    return dataset.get_index()
+
+def validation_message(error):
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+def predict_rows(rows):
+    """
+    Validate each row separately and score all valid rows with a single
+    vectorized `predict`. Invalid rows get an error instead of a prediction.
+    """
+    if len(rows) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size is limited to {MAX_BATCH_SIZE} rows.")
+
+    with stage("prediction_batch", "model"):
+        ml_model = registry.get()
+    valid_rows, valid_index, errors = [], [], []
+    with stage("prediction_batch", "validation"):
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({"row": i, "detail": f"Row must be an object, got {type(row).__name__}"})
+                continue
+            # Defaults of PredictionFeatures are examples for the docs, not values to score a row with
+            missing = [field for field in FEATURE_COLUMNS if field not in row]
+            if missing:
+                errors.append({"row": i, "detail": "; ".join(f"{field}: Field required" for field in missing)})
+                continue
+            try:
+                features = dict(PredictionFeatures(**row))
+            except (ValidationError, TypeError) as e:
+                detail = validation_message(e) if isinstance(e, ValidationError) else str(e)
+                errors.append({"row": i, "detail": detail})
+                continue
+            unknown = ml_model.unknown_categories(features)
+            if unknown:
+                errors.append({"row": i, "detail": f"unknown category in {', '.join(unknown)}"})
+                continue
+            valid_rows.append(features)
+            valid_index.append(i)
+
+    predictions = [None] * len(rows)
+    if prediction_cache is not None and valid_rows:
+        with stage("prediction_batch", "cache"):
+            keys, missing_rows, missing_index = [], [], []
+            for i, features in zip(valid_index, valid_rows):
+                key, features = prediction_cache.prepare(features)
+                hit = prediction_cache.get(key, ml_model.version)
+                if hit is None:
+                    keys.append(key)
+                    missing_rows.append(features)
+                    missing_index.append(i)
+                else:
+                    predictions[i] = hit
+            valid_rows, valid_index = missing_rows, missing_index
+    if valid_rows:
+        with stage("prediction_batch", "inference"):
+            results = ml_model.predict_many(valid_rows, FEATURE_COLUMNS)
+        for i, prediction in zip(valid_index, results):
+            predictions[i] = prediction
+        if prediction_cache is not None:
+            for key, prediction in zip(keys, results):
+                prediction_cache.put(key, ml_model.version, prediction)
+    return {"predictions": predictions, "errors": errors}
+
 
 # Endpoints
 
@@ -101,21 +478,24 @@ async def random_data(n_rows: int = 5):
     """
     Display a number of rows of the dataset. Enter an integer in n_row.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
-    if n_rows > len(data):
-        response = {"message : dataset has less row than n_row you entered."}
-    else:
-        sample = data.sample(n_rows)
-        response = sample.to_json(orient='records')
-    return response
+    def preview():
+        with stage("preview", "dataset"):
+            data = dataset.get()
+        if n_rows > len(data):
+            response = {"message : dataset has less row than n_row you entered."}
+        else:
+            sample = data.sample(n_rows)
+            response = sample.to_json(orient='records')
+        return response
+    return await offload("preview", preview)
 
 @app.get("/column_names", tags=["Preview"])
 async def column_names():
     """
     Display column names of the dataset.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
-    columns = {"column names :": list(data.columns)}
+    index = await current_index("column_names")
+    columns = {"column names :": list(index.data.columns)}
     return columns
 
 @app.get("/unique-values", tags=["Preview"])
@@ -123,42 +503,70 @@ async def unique_values(column: str = "model_key"):
     """
     Get unique values from a given column.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
-    uniq_v = pd.Series(data[column].unique())
-    return uniq_v.to_json()
+    with stage("unique_values", "dataset"):
+        index = await current_index("unique_values")
+    return index.unique_values[column]
+
+def quantile_response(column, percent, top, page):
+    with stage("quantile", "dataset"):
+        index = dataset.get_index()
+    if page.is_default():
+        with stage("quantile", "query"):
+            data = index.quantile_rows(column, percent, top)
+        with stage("quantile", "serialize"):
+            return data.to_json()
+    with stage("quantile", "query"):
+        positions = index.quantile_positions(column, percent, top)
+    return rows_response("quantile", index.data, positions, page)
+
+@app.get("/dataset/status", tags=["Preview"])
+async def dataset_status():
+    """
+    Rows, reload count and last reload error of the dataset served by this worker.
+    """
+    return dataset.status()
 
 @app.get("/quantile", tags=["Numerical"])
-async def quantile(column: str = "mileage", percent: float = 0.1, top: bool = True):
+async def quantile(column: str = "mileage", percent: float = 0.1, top: bool = True, page: Page = Depends(page_params)):
     """
     Get a values of dataset according above or below a given quantile. 
     Columns possible values are:
     * `['mileage', 'engine_power', 'rental_price_per_day']`
     You can choose whether you want the top quantile or the bottom quantile by specify `top=True` or `top=False`. Default value is `top=True`.
     Accepted values for percentage is a float between `0.01` and `0.99`, default is `0.1`.
+
+    For big results, use `limit` and `offset` to paginate, `columns` to keep only some columns,
+    and `format=ndjson` or `format=csv` to stream rows instead of building one JSON document.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
     if percent > 0.99 or percent <0.01:
         msg = "percentage value is not accepted"
         return msg
     else:
-        if top:
-            data = data[ data[column] > data[column].quantile(1-percent)]
-        else:
-            data = data[ data[column] < data[column].quantile(percent)]
-        return data.to_json()
+        return await offload("quantile", quantile_response, column, percent, top, page)
+
+def filter_response(column, categories, page):
+    # Matching rows are cached per dataset version
+    with stage("filter_by", "dataset"):
+        index = dataset.get_index()
+    with stage("filter_by", "query"):
+        positions = index.filter_positions(column, categories)
+    if page.is_default():
+        with stage("filter_by", "serialize"):
+            return index.data.iloc[positions].to_json()
+    return rows_response("filter_by", index.data, positions, page)
 
 @app.post("/filter-by", tags=["Categorical"])
-async def filter_by(filterBy: FilterBy):
+async def filter_by(filterBy: FilterBy, page: Page = Depends(page_params)):
     """
     Filter by one or more categories in a given column. Columns possible values are:
     * `['model_key', 'fuel', 'paint_color', 'car_type', 'private_parking_available', 'has_gps', 'has_air_conditioning', 'automatic_car', 'has_getaround_connect', 'has_speed_regulator', 'winter_tires']`
     Check values within dataset to know what kind of `categories` you can filter by. You can use `/unique-values` path to check them out.
     `categories` must be `list` format.
+
+    Same `limit`, `offset`, `columns` and `format` query parameters as `/quantile` to paginate or stream the result.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
     if filterBy.by_category != None:
-        data = data[data[filterBy.column].isin(filterBy.by_category)]
-        return data.to_json()
+        return await offload("filter_by", filter_response, filterBy.column, tuple(filterBy.by_category), page)
     else:
         msg = "Please chose a column to filter by"
         return msg
@@ -171,13 +579,17 @@ async def group_by(groupBy: GroupBy):
     You can use different method to group by method which are:
     * `mean`, `median`, `min`, `max`, `sum`, `count`.
     """
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
-    data_group = data.groupby(groupBy.column).agg(groupBy.by_method, numeric_only=True)
-    return data_group.to_json()
+    def group():
+        with stage("groupby", "dataset"):
+            index = dataset.get_index()
+        # Precomputed for categorical columns
+        with stage("groupby", "aggregate"):
+            return index.group_by(groupBy.column, groupBy.by_method)
+    return await offload("groupby", group)
 
 
 @app.post("/prediction", tags = ["Prediction"])
-async def predict(features: PredictionFeatures):
+async def predict(features: PredictionFeatures, request: Request):
     """
     Prediction for single set of input variables. Possible input values in order are:\n\n
     model_key: str\n
@@ -204,17 +616,152 @@ async def predict(features: PredictionFeatures):
     Take care to fill boolean value with true and not True with capital letter.
     """
 
-    # Read data 
-    data = pd.DataFrame(dict(features), index=[0])
-    # Load model
-    ml_model = joblib.load("model.joblib")
-    # Prediction
-    prediction = ml_model.predict(data)
-    print(prediction.tolist()[0])
+    record_parsing(request, "prediction")
+    features = dict(features)
+    # Get model loaded at startup
+    with stage("prediction", "model"):
+        ml_model = registry.get()
+    if prediction_cache is not None:
+        with stage("prediction", "cache"):
+            key, features = prediction_cache.prepare(features)
+            prediction = await cached(prediction_cache.get, key, ml_model.version)
+        if prediction is not None:
+            return {"prediction": prediction}
+
+    if batcher is not None:
+        # Scored together with concurrent requests
+        with stage("prediction", "micro_batch"):
+            prediction = await guarded("prediction", batcher.submit(features))
+    elif ml_model.fast is not None:
+        # Encoded straight to the booster: cheaper than a trip to the executor
+        with stage("prediction", "inference"):
+            prediction = ml_model.predict_one(features)
+    else:
+        with stage("prediction", "inference"):
+            prediction = await offload("prediction", ml_model.predict_one, features)
+    if prediction_cache is not None:
+        await cached(prediction_cache.put, key, ml_model.version, prediction)
     # Format response
-    response ={"prediction": prediction.tolist()[0]}
+    response ={"prediction": prediction}
     return response
 
+@app.get("/prediction/micro-batching", tags = ["Prediction"])
+async def micro_batching_stats():
+    """
+    Micro-batching settings and batch size distribution (`{batch_size: number_of_batches}`) of this worker.
+    Enable it with `MICRO_BATCHING=1`, tune it with `MICRO_BATCH_WINDOW_MS` and `MICRO_BATCH_MAX_ROWS`.
+    """
+    if batcher is None:
+        return {"enabled": False}
+    return batcher.stats()
+
+@app.get("/prediction/cache", tags = ["Prediction"])
+async def prediction_cache_stats():
+    """
+    Settings, size and hit/miss/eviction counters of the prediction cache of this worker.
+    Enable it with `PREDICTION_CACHE=memory` or `PREDICTION_CACHE=sqlite` (shared by the workers).
+    """
+    if prediction_cache is None:
+        return {"enabled": False}
+    if prediction_cache.blocking:
+        return await guarded("prediction_cache", cache_executor.run("prediction_cache", prediction_cache.stats), cache_executor)
+    return prediction_cache.stats()
+
+@app.post("/prediction/batch", tags = ["Prediction"])
+async def predict_batch(request: Request, rows: List[Any] = Body(..., examples=[[dict(PredictionFeatures())]])):
+    """
+    Prediction for a list of cars, with the same fields as `/prediction`, scored in one call.
+
+    Endpoint will return a dictionnary like this:
+    \n\n
+    ```
+    {'predictions': [rental_price_per_day, null, ...], 'errors': [{'row': 1, 'detail': '...'}]}
+    ```
+    \n\n
+    A row that does not validate gets `null` as prediction and an entry in `errors`; other rows are still scored.
+    """
+    record_parsing(request, "prediction_batch")
+    return await offload("prediction_batch", predict_rows, rows)
+
+@app.post("/prediction/batch/csv", tags = ["Prediction"])
+async def predict_batch_csv(file: UploadFile = File(...)):
+    """
+    Same as `/prediction/batch` with a CSV file upload. The file needs a header with the feature columns,
+    other columns (like `rental_price_per_day`) are ignored.
+    """
+    def predict_csv():
+        try:
+            data = pd.read_csv(file.file)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"Could not read CSV file: {e}")
+        missing = [field for field in FEATURE_COLUMNS if field not in data.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"CSV file lacks columns: {', '.join(missing)}")
+        # Empty cells become None so they are reported instead of silently taking a default value
+        rows = data.astype(object).where(data.notna(), None).to_dict(orient="records")
+        return predict_rows(rows)
+    return await offload("prediction_batch", predict_csv)
+
+@app.get("/model/status", tags = ["Prediction"])
+async def model_status():
+    """
+    Version, load time and reload count of the model served by this worker.
+    """
+    return registry.status()
+
+@app.get("/executor", tags = ["Monitoring"])
+async def executor_stats():
+    """
+    Size, queue and counters (completed, failed, cancelled, rejected with 503, timed out with 504) of the thread pool of this worker.
+    Set with `EXECUTOR_THREADS`, `EXECUTOR_MAX_QUEUE`, `EXECUTOR_TIMEOUT` and `EXECUTOR_TIMEOUTS`.
+    """
+    return executor.stats()
+
+@app.get("/metrics", tags = ["Monitoring"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Request counts and latency histograms per route, per-stage timings of the handlers,
+    model/dataset/result cache hits and memory of the worker answering, in Prometheus text format.
+    """
+    metrics.CACHE_REQUESTS.set("model", "hit", value=registry.hits)
+    metrics.CACHE_REQUESTS.set("model", "miss", value=registry.reloads + (registry.current is not None))
+    metrics.CACHE_REQUESTS.set("dataset", "hit", value=dataset.hits)
+    metrics.CACHE_REQUESTS.set("dataset", "miss", value=dataset.loads)
+    metrics.RELOAD_ERRORS.set("dataset", value=dataset.errors)
+    if prediction_cache is not None:
+        metrics.CACHE_REQUESTS.set("prediction", "hit", value=prediction_cache.hits)
+        metrics.CACHE_REQUESTS.set("prediction", "miss", value=prediction_cache.misses)
+        metrics.CACHE_REQUESTS.set("prediction", "error", value=prediction_cache.errors)
+        metrics.CACHE_REQUESTS.set("prediction", "skipped", value=prediction_cache.skipped)
+        metrics.CACHE_EVICTIONS.set("prediction", value=prediction_cache.evictions)
+    if dataset.index is not None:
+        info = dataset.index.filter_positions.cache_info()
+        metrics.CACHE_REQUESTS.set("filter_positions", "hit", value=info.hits)
+        metrics.CACHE_REQUESTS.set("filter_positions", "miss", value=info.misses)
+    for result in ("completed", "failed", "cancelled", "rejected", "timed_out"):
+        metrics.EXECUTOR_JOBS.set(result, value=getattr(executor, result))
+    metrics.EXECUTOR_PENDING.set(value=executor.pending)
+    return metrics.render()
+
+@app.post("/debug/profiler/start", tags = ["Monitoring"])
+async def start_profiler(interval_ms: float = Query(5, ge=1)):
+    """
+    Start sampling the stacks of this worker every `interval_ms`. Needs `PROFILER_ENABLED=1`.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled.")
+    started = metrics.profiler.start(interval_ms / 1000)
+    return {"started": started, "pid": os.getpid()}
+
+@app.post("/debug/profiler/stop", tags = ["Monitoring"], response_class=PlainTextResponse)
+async def stop_profiler():
+    """
+    Stop the profiler and get the collapsed stacks, to feed to `flamegraph.pl` or speedscope.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled.")
+    return await asyncio.to_thread(metrics.profiler.stop)
+
 
 if __name__=="__main__":
     uvicorn.run(app, host="0.0.0.0", port=4000, debug=True, reload=True)
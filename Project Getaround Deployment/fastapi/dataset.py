@@ -0,0 +1,181 @@
+import os
+import threading
+import functools
+import numpy as np
+import pandas as pd
+
+from data_cache import load_cached
+
+
+# Explicit dtypes so the CSV is parsed without type inference
+CATEGORICAL_COLUMNS = ["model_key", "fuel", "paint_color", "car_type"]
+BOOLEAN_COLUMNS = [
+    "private_parking_available", "has_gps", "has_air_conditioning", "automatic_car",
+    "has_getaround_connect", "has_speed_regulator", "winter_tires",
+]
+INTEGER_COLUMNS = ["mileage", "engine_power", "rental_price_per_day"]
+
+DTYPES = {
+    **{column: "category" for column in CATEGORICAL_COLUMNS},
+    **{column: "bool" for column in BOOLEAN_COLUMNS},
+    **{column: "int64" for column in INTEGER_COLUMNS},
+}
+
+
+GROUP_METHODS = ["mean", "median", "max", "min", "sum", "count"]
+
+# Number of /filter-by row selections kept per dataset version
+FILTER_CACHE_SIZE = int(os.environ.get("FILTER_CACHE_SIZE", 256))
+
+
+def read_pricing_csv(path):
+    return pd.read_csv(path, index_col=0, dtype=DTYPES)
+
+
+def sorted_quantile(sorted_values, q):
+    """
+    Same value as `Series.quantile(q)` (linear interpolation), read from an
+    already sorted array instead of partitioning the data again.
+    """
+    position = q * (len(sorted_values) - 1)
+    low = int(np.floor(position))
+    high = min(low + 1, len(sorted_values) - 1)
+    a, b = float(sorted_values[low]), float(sorted_values[high])
+    t = position - low
+    # numpy's lerp, so the threshold is bit-identical to pandas
+    if t >= 0.5:
+        return b - (b - a) * (1 - t)
+    return a + (b - a) * t
+
+
+class DatasetIndex:
+    """
+    Aggregates precomputed once per dataset version: unique values of every
+    column, sorted numeric columns for quantiles, and all `GroupBy` methods
+    for every categorical column. `/filter-by` matching row positions are
+    cached on top; the JSON is built per request from them, so the cache
+    stays small whatever the size of the results.
+    A new index is built when the dataset is reloaded, which drops the cache.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.unique_values = {
+            column: pd.Series(data[column].unique()).to_json() for column in data.columns
+        }
+        self.sorted_columns = {}
+        for column in data.select_dtypes("number").columns:
+            values = data[column].to_numpy()
+            order = np.argsort(values, kind="stable")
+            self.sorted_columns[column] = (values[order], order)
+        self.groups = {
+            (column, method): self.aggregate(column, method)
+            for column in CATEGORICAL_COLUMNS + BOOLEAN_COLUMNS
+            for method in GROUP_METHODS
+        }
+        self.filter_positions = functools.lru_cache(maxsize=FILTER_CACHE_SIZE)(self._filter_positions)
+
+    def aggregate(self, column, method):
+        grouped = self.data.groupby(column, observed=True)
+        if method == "count":
+            numeric = self.data.drop(columns=column).select_dtypes(["number", "bool"]).columns
+            return grouped[list(numeric)].count().to_json()
+        return grouped.agg(method, numeric_only=True).to_json()
+
+    def group_by(self, column, method):
+        if (column, method) in self.groups:
+            return self.groups[(column, method)]
+        return self.aggregate(column, method)
+
+    def quantile_positions(self, column, percent, top):
+        """
+        Positions of rows strictly above the `1 - percent` quantile (top) or
+        strictly below the `percent` quantile, in dataset order.
+        """
+        if column not in self.sorted_columns:
+            raise KeyError(column)
+        sorted_values, order = self.sorted_columns[column]
+        if top:
+            threshold = sorted_quantile(sorted_values, 1 - percent)
+            positions = order[np.searchsorted(sorted_values, threshold, side="right"):]
+        else:
+            threshold = sorted_quantile(sorted_values, percent)
+            positions = order[:np.searchsorted(sorted_values, threshold, side="left")]
+        return np.sort(positions)
+
+    def quantile_rows(self, column, percent, top):
+        return self.data.iloc[self.quantile_positions(column, percent, top)]
+
+    def _filter_positions(self, column, categories):
+        return np.flatnonzero(self.data[column].isin(categories).to_numpy())
+
+
+class PricingDataset:
+    """
+    Pricing dataset kept in memory. It is read once (from its Parquet cache
+    when fresh) and read again only when the file modification time changes.
+    A file that fails to load keeps the previous dataset serving and records the error.
+    """
+
+    def __init__(self, path="get_around_pricing_project.csv"):
+        self.path = path
+        self.index = None
+        self.mtime = None
+        self.loads = 0
+        self.hits = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self.mtime:
+                try:
+                    index = DatasetIndex(load_cached(self.path, read_pricing_csv))
+                except Exception as e:
+                    if self.index is None:
+                        raise
+                    self.errors += 1
+                    self.last_error = repr(e)
+                    # Do not parse the same broken file again on every request
+                    self.mtime = mtime
+                    return self.index
+                self.index = index
+                self.mtime = mtime
+                self.loads += 1
+                self.last_error = None
+        return self.index
+
+    def is_stale(self):
+        """
+        True when the next `get_index` will read the file.
+        """
+        return self.index is None or os.path.getmtime(self.path) != self.mtime
+
+    def get_index(self):
+        """
+        Precomputed aggregates of the current dataset, reloaded first if
+        the file changed on disk.
+        """
+        if self.is_stale():
+            return self.load()
+        self.hits += 1
+        return self.index
+
+    def status(self):
+        return {
+            "loaded": self.index is not None,
+            "path": self.path,
+            "mtime": self.mtime,
+            "rows": len(self.index.data) if self.index is not None else None,
+            "loads": self.loads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+    def get(self):
+        """
+        Current dataset. Callers must not modify the returned frame.
+        """
+        return self.get_index().data
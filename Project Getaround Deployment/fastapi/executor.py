@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorOverloaded(Exception):
+    """
+    Raised when the executor queue is full: the caller should answer 503.
+    """
+
+
+def parse_timeouts(setting):
+    """
+    Per-endpoint timeouts from "groupby=2,quantile=5" (seconds).
+    """
+    timeouts = {}
+    for item in setting.split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class BoundedExecutor:
+    """
+    Thread pool for the blocking pandas and model work of the handlers,
+    so the event loop keeps serving other requests meanwhile.
+
+    At most `max_workers` jobs run and `max_queue` wait; past that, `run`
+    raises `ExecutorOverloaded` at once instead of piling up requests.
+    A job that times out is not interrupted (threads cannot be), so it
+    keeps its slot until it really finishes.
+    """
+
+    def __init__(self, max_workers=4, max_queue=32, timeouts=None, default_timeout=30.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.pending = 0
+        # Outcome of the jobs that left the pool
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="api-worker")
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            # Cancelled: still waiting for a thread at its timeout, or at shutdown
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def timeout(self, endpoint):
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    async def run(self, endpoint, function, *args, **kwargs):
+        """
+        Run `function(*args, **kwargs)` in the pool, with the timeout of `endpoint`.
+        """
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorOverloaded(endpoint)
+            self.pending += 1
+        return await self._submit(self.timeout(endpoint), function, *args, **kwargs)
+
+    async def run_admitted(self, endpoint, function, *args, **kwargs):
+        """
+        Like `run`, for more work of a request `run` already admitted (e.g. the
+        next chunk of a streamed response): it waits for a thread like any job,
+        but is never rejected, since the response has already started.
+        """
+        with self._lock:
+            self.pending += 1
+        return await self._submit(self.timeout(endpoint), function, *args, **kwargs)
+
+    async def _submit(self, timeout, function, *args, **kwargs):
+        future = self._pool.submit(functools.partial(function, *args, **kwargs))
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "default_timeout": self.default_timeout,
+            "timeouts": self.timeouts,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
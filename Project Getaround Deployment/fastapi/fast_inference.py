@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+
+
+def encoder_spec(pipeline):
+    """
+    Fitted preprocessing of a `Pipeline(ColumnTransformer(OneHotEncoder, StandardScaler), XGBRegressor)`
+    as plain python values: one-hot categories (with the dropped one) and scaler means/scales,
+    in the column order the regressor was trained on.
+
+    Raises ValueError for any other setup (passthrough columns, sparse output, unknown or
+    infrequent categories not raising, partial scaling), which `FeatureEncoder` would not
+    reproduce: callers then keep using `Pipeline.predict`.
+    """
+    preprocessor = pipeline.steps[0][1]
+    categorical, numeric = [], []
+    offset = 0
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        kind = type(transformer).__name__
+        if kind == "OneHotEncoder":
+            if transformer.handle_unknown != "error":
+                raise ValueError(f"Unsupported handle_unknown={transformer.handle_unknown!r} in {name}")
+            if getattr(transformer, "sparse_output", False) or getattr(transformer, "sparse", None) is True:
+                raise ValueError(f"Unsupported sparse output in {name}")
+            if transformer.min_frequency is not None or transformer.max_categories is not None:
+                raise ValueError(f"Unsupported infrequent categories in {name}")
+            drop_idx = transformer.drop_idx_ if transformer.drop_idx_ is not None else [None] * len(columns)
+            for column, categories, dropped in zip(columns, transformer.categories_, drop_idx):
+                categories = categories.tolist()
+                dropped = None if dropped is None else int(dropped)
+                categorical.append({"column": column, "categories": categories, "dropped": dropped, "offset": offset})
+                offset += len(categories) - (dropped is not None)
+        elif kind == "StandardScaler":
+            if not (transformer.with_mean and transformer.with_std):
+                raise ValueError(f"Unsupported StandardScaler without mean or std in {name}")
+            for column, mean, scale in zip(columns, transformer.mean_.tolist(), transformer.scale_.tolist()):
+                numeric.append({"column": column, "mean": mean, "scale": scale, "offset": offset})
+                offset += 1
+        else:
+            # Includes a "passthrough" remainder, whose raw columns the encoder would not place
+            raise ValueError(f"Unsupported transformer {name}: {transformer if isinstance(transformer, str) else kind}")
+    return {"categorical": categorical, "numeric": numeric, "n_features": offset}
+
+
+class FeatureEncoder:
+    """
+    Encode one car straight into a float32 array, with the same layout as the
+    pipeline's ColumnTransformer output.
+    """
+
+    def __init__(self, spec):
+        self.n_features = spec["n_features"]
+        self.categorical = []
+        for item in spec["categorical"]:
+            positions = {}
+            position = item["offset"]
+            for i, category in enumerate(item["categories"]):
+                if i == item["dropped"]:
+                    positions[category] = None
+                else:
+                    positions[category] = position
+                    position += 1
+            self.categorical.append((item["column"], positions))
+        self.numeric = [(item["column"], item["offset"], item["mean"], item["scale"]) for item in spec["numeric"]]
+        self._local = threading.local()
+
+    def categories(self):
+        """
+        Accepted categories per categorical column.
+        """
+        return {column: set(positions) for column, positions in self.categorical}
+
+    def buffer(self):
+        """
+        Preallocated row, one per thread.
+        """
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.zeros((1, self.n_features), dtype=np.float32)
+        return row
+
+    def encode(self, features, out=None):
+        if out is None:
+            out = self.buffer()[0]
+        out[:] = 0
+        for column, positions in self.categorical:
+            value = features[column]
+            try:
+                position = positions[value]
+            except (KeyError, TypeError):
+                raise ValueError(f"Found unknown categories [{value!r}] in column {column} during transform")
+            if position is not None:
+                out[position] = 1
+        for column, position, mean, scale in self.numeric:
+            out[position] = (features[column] - mean) / scale
+        return out
+
+    def encode_many(self, rows):
+        out = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for i, features in enumerate(rows):
+            self.encode(features, out[i])
+        return out
+
+
+class FastPredictor:
+    """
+    Single-row inference without pandas nor sklearn dispatch: encode into a
+    preallocated array and call the XGBoost booster directly.
+    """
+
+    def __init__(self, encoder, booster):
+        self.encoder = encoder
+        self.booster = booster
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        return cls(FeatureEncoder(encoder_spec(pipeline)), pipeline.steps[-1][1].get_booster())
+
+    def predict_one(self, features):
+        row = self.encoder.buffer()
+        self.encoder.encode(features, row[0])
+        return float(self.booster.inplace_predict(row)[0])
+
+    def predict_many(self, rows):
+        return self.booster.inplace_predict(self.encoder.encode_many(rows))
+
+
+# Compact serving artifact: the native booster (`model.ubj`) next to the
+# preprocessing spec (`model.spec.json`), loaded with numpy and xgboost only
+
+def spec_path(booster_path):
+    return os.path.splitext(booster_path)[0] + ".spec.json"
+
+
+def export_artifact(pipeline, path="model.ubj"):
+    """
+    Write the booster of a fitted pipeline in XGBoost's own format (UBJSON for `.ubj`,
+    JSON for `.json`) and its preprocessing spec. The spec is written first and the
+    booster last, each through a temporary file, so a watcher of the booster file
+    never loads a half-written artifact.
+    """
+    import xgboost
+
+    spec = dict(encoder_spec(pipeline), xgboost_version=xgboost.__version__)
+    root, extension = os.path.splitext(path)
+    tmp_spec, tmp_booster = f"{root}.tmp.spec.json", f"{root}.tmp{extension}"
+    with open(tmp_spec, "w") as f:
+        json.dump(spec, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_spec, spec_path(path))
+    pipeline.steps[-1][1].get_booster().save_model(tmp_booster)
+    os.replace(tmp_booster, path)
+    return path
+
+
+def load_artifact(path="model.ubj"):
+    import xgboost
+
+    with open(spec_path(path)) as f:
+        spec = json.load(f)
+    booster = xgboost.Booster()
+    booster.load_model(path)
+    return FastPredictor(FeatureEncoder(spec), booster)
+
+
+def check_parity(pipeline, csv_path="get_around_pricing_project.csv", tolerance=1e-4, predictor=None):
+    """
+    Compare a fast predictor (row by row), by default the one built from `pipeline`,
+    with `Pipeline.predict` on every row of the dataset.
+    Returns the rows that differ by more than `tolerance` and the maximum difference.
+    """
+    import pandas as pd
+
+    data = pd.read_csv(csv_path, index_col=0).drop(columns="rental_price_per_day", errors="ignore")
+    expected = pipeline.predict(data)
+    fast = predictor or FastPredictor.from_pipeline(pipeline)
+    actual = np.array([fast.predict_one(row) for row in data.to_dict(orient="records")])
+    difference = np.abs(actual - expected)
+    return data.index[difference > tolerance].tolist(), float(difference.max())
+
+
+if __name__ == "__main__":
+    # commande : python fast_inference.py [model.joblib] [get_around_pricing_project.csv] [--export model.ubj]
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Parity of the fast inference path and of the compact artifact with the pipeline")
+    parser.add_argument("model_path", nargs="?", default="model.joblib")
+    parser.add_argument("csv_path", nargs="?", default="get_around_pricing_project.csv")
+    parser.add_argument("--artifact", default="model.ubj", help="compact artifact checked when it exists")
+    parser.add_argument("--export", action="store_true", help="write the compact artifact from the pipeline first")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model_path)
+    if args.export:
+        export_artifact(pipeline, args.artifact)
+    checks = [("fast path", None)]
+    if os.path.exists(args.artifact):
+        checks.append((args.artifact, load_artifact(args.artifact)))
+    failed = False
+    for name, predictor in checks:
+        mismatches, max_difference = check_parity(pipeline, args.csv_path, predictor=predictor)
+        print(f"{name}: max difference: {max_difference}, rows over tolerance: {len(mismatches)}")
+        failed = failed or bool(mismatches)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,19 @@
+import gc
+import os
+
+# commande : gunicorn api:app --config gunicorn.conf.py
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '4000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# Import the app (and load the model) in the master process, so workers
+# share the model memory pages after fork instead of each loading a copy.
+preload_app = True
+
+
+def when_ready(server):
+    import api
+    api.registry.ensure_loaded()
+    # Keep refcount updates from un-sharing the preloaded objects
+    gc.freeze()
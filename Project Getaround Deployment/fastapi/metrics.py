@@ -0,0 +1,242 @@
+import os
+import sys
+import time
+import resource
+import threading
+from collections import Counter as Tally
+from contextlib import contextmanager
+
+
+# Seconds, from sub-millisecond model calls to slow analytics requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, *labels, value):
+        """
+        Set from a total counted elsewhere (e.g. cache statistics), at scrape time.
+        """
+        with self._lock:
+            self.values[labels] = value
+
+    def render(self):
+        with self._lock:
+            values = dict(self.values)
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, labels)} {value}" for labels, value in values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, *labels, value):
+        with self._lock:
+            series = self.values.setdefault(labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labels, value=time.perf_counter() - start)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            values = {labels: dict(series, buckets=list(series["buckets"])) for labels, series in self.values.items()}
+        bucket_labels = self.labels + ("le",)
+        for labels, series in values.items():
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f"{self.name}_bucket{format_labels(bucket_labels, labels + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(bucket_labels, labels + ('+Inf',))} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {series['count']}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ["method", "route"])
+STAGE_LATENCY = Histogram("handler_stage_duration_seconds", "Time spent in each stage of a handler.", ["handler", "stage"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Lookups in the model, dataset and result caches.", ["cache", "result"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries evicted from the result caches (size, age or model change).", ["cache"])
+RELOAD_ERRORS = Counter("reload_errors_total", "Failed reloads of a data file, the previous version kept serving.", ["source"])
+EXECUTOR_JOBS = Counter("executor_jobs_total", "Jobs of the handler thread pool by outcome.", ["result"])
+EXECUTOR_PENDING = Gauge("executor_pending_jobs", "Jobs running or waiting in the handler thread pool.")
+MEMORY = Gauge("process_resident_memory_bytes", "Resident memory of this worker.")
+MAX_MEMORY = Gauge("process_max_resident_memory_bytes", "Peak resident memory of this worker.")
+
+METRICS = [REQUESTS, REQUEST_LATENCY, STAGE_LATENCY, CACHE_REQUESTS, CACHE_EVICTIONS, RELOAD_ERRORS, EXECUTOR_JOBS, EXECUTOR_PENDING, MEMORY, MAX_MEMORY]
+
+
+def stage(handler, name):
+    """
+    Time a stage of a handler: `with stage("prediction", "inference"): ...`
+    """
+    return STAGE_LATENCY.time(handler, name)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and timing them per route template,
+    until the last byte of the body (streamed responses included).
+    A request whose handler raised is recorded with status 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        # Read by the handlers as `request.state.start`
+        scope.setdefault("state", {})["start"] = start
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # Route template (e.g. /quantile), not the raw path, to keep label cardinality bounded
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.observe(scope["method"], path, value=time.perf_counter() - start)
+            REQUESTS.inc(scope["method"], path, status)
+
+
+def resident_memory():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def render():
+    """
+    All metrics in Prometheus text format. Each gunicorn worker keeps its own metrics.
+    """
+    rss = resident_memory()
+    if rss is not None:
+        MEMORY.set(value=rss)
+    # ru_maxrss is in kilobytes on Linux
+    MAX_MEMORY.set(value=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads every `interval` seconds from a background
+    thread, and aggregate them as collapsed stacks (`frame;frame;frame count`),
+    the input format of flamegraph.pl and speedscope.
+    """
+
+    # Shorter intervals would keep the sampler spinning on the GIL
+    MIN_INTERVAL = 0.001
+
+    def __init__(self):
+        self.samples = Tally()
+        self.interval = 0.005
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self.running:
+                return False
+            self.samples = Tally()
+            self.interval = max(interval, self.MIN_INTERVAL)
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """
+        Stop sampling and return the collapsed stacks. Blocks until the
+        sampling thread exits: call it off the event loop.
+        """
+        with self._lock:
+            if not self.running:
+                return ""
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,249 @@
+import os
+import time
+import asyncio
+import threading
+import joblib
+import pandas as pd
+
+from data_cache import source_checksum
+from fast_inference import FastPredictor, load_artifact, spec_path
+
+
+class LoadedModel:
+    """
+    Immutable snapshot of a loaded model. The registry swaps whole snapshots,
+    so a request always predicts with one consistent model.
+
+    `model` is the sklearn pipeline, or None for a compact artifact served
+    by its `fast` predictor only.
+    """
+
+    def __init__(self, model, path, version, mtime, load_seconds, fast=None):
+        self.model = model
+        self.path = path
+        self.version = version
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        if model is None:
+            self.fast = fast
+            self.categories = fast.encoder.categories()
+            return
+        self.categories = known_categories(model)
+        try:
+            self.fast = FastPredictor.from_pipeline(model)
+        except (AttributeError, IndexError, ValueError):
+            # Not a ColumnTransformer + XGBoost pipeline: use Pipeline.predict only
+            self.fast = None
+
+    def predict_many(self, rows, columns):
+        """
+        Predictions for a list of feature dicts, without a DataFrame when the fast path is there.
+        """
+        if self.fast is not None:
+            return self.fast.predict_many(rows).tolist()
+        return self.model.predict(pd.DataFrame.from_records(rows, columns=columns)).tolist()
+
+    def predict_one(self, features):
+        """
+        Prediction for a single car given as a dict of features.
+        """
+        if self.fast is not None:
+            return self.fast.predict_one(features)
+        return self.model.predict(pd.DataFrame(features, index=[0])).tolist()[0]
+
+    def unknown_categories(self, row):
+        """
+        Columns of `row` holding a category the encoder never saw, which
+        would make the whole `predict` call fail.
+        """
+        return [
+            column for column, values in self.categories.items()
+            if row.get(column) not in values
+        ]
+
+
+def known_categories(model):
+    """
+    Categories accepted by the fitted one-hot encoders of a pipeline, per column.
+    Encoders that ignore unknown values are skipped.
+    """
+    categories = {}
+    for _, step in getattr(model, "steps", []):
+        for _, transformer, columns in getattr(step, "transformers_", []):
+            if getattr(transformer, "handle_unknown", None) != "error":
+                continue
+            for column, values in zip(columns, getattr(transformer, "categories_", [])):
+                categories[column] = set(values.tolist())
+    return categories
+
+
+def file_version(*paths):
+    """
+    Short content hash of the model file(s), used as model version.
+    """
+    return source_checksum(*paths)[:12]
+
+
+def is_artifact(path):
+    """
+    True for a compact artifact (native booster + spec), False for a pickled pipeline.
+    """
+    return os.path.splitext(path)[1] in (".ubj", ".json")
+
+
+def default_model_path(directory="."):
+    """
+    The version trained last by `train.py` (`models/LATEST`), else the compact
+    artifact when it was exported, else the pickled pipeline.
+    """
+    pointer = os.path.join(directory, "models", "LATEST")
+    if os.path.exists(pointer):
+        return pointer
+    artifact = os.path.join(directory, "model.ubj")
+    if os.path.exists(artifact) and os.path.exists(spec_path(artifact)):
+        return artifact
+    return os.path.join(directory, "model.joblib")
+
+
+def resolve_model_path(path):
+    """
+    Model file behind `path`: a `LATEST` pointer file names a version directory
+    next to it, holding a compact artifact and/or a pickled pipeline.
+    """
+    if os.path.basename(path) != "LATEST":
+        return path
+    with open(path) as f:
+        version = f.read().strip()
+    return default_model_path(os.path.join(os.path.dirname(path), version))
+
+
+class ModelRegistry:
+    """
+    Load the model once and share it between requests.
+
+    With gunicorn `preload_app`, the model is loaded in the master before
+    workers fork, so all workers share the same read-only memory pages.
+    `watch()` polls the file and atomically swaps in a new snapshot when
+    it changes on disk; in-flight requests keep the old one.
+
+    `path` is either a compact artifact (`model.ubj`, loaded with numpy and
+    xgboost only), a pickled pipeline (`model.joblib`, needs scikit-learn),
+    or the `models/LATEST` pointer written by `train.py`: the registry then
+    watches the pointer and loads the version it names.
+    Without `path`, it serves `default_model_path(directory)`, looked up again
+    on every poll, so the first `models/LATEST` written is picked up too.
+    """
+
+    def __init__(self, path=None, poll_interval=5.0, directory="."):
+        self.path = path
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.current = None
+        self.reloads = 0
+        self.hits = 0
+        self.last_error = None
+        # (source, mtime) of the last file loaded, or tried
+        self._seen = None
+        self._lock = threading.Lock()
+
+    def source(self):
+        """
+        File the model is loaded from, and watched.
+        """
+        return self.path or default_model_path(self.directory)
+
+    def _load(self, source):
+        start = time.perf_counter()
+        mtime = os.path.getmtime(source)
+        path = resolve_model_path(source)
+        if is_artifact(path):
+            version = file_version(path, spec_path(path))
+            fast = load_artifact(path)
+            return LoadedModel(None, path, version, mtime, time.perf_counter() - start, fast=fast)
+        version = file_version(path)
+        model = joblib.load(path)
+        return LoadedModel(model, path, version, mtime, time.perf_counter() - start)
+
+    def load(self):
+        """
+        Load (or reload) the model from disk and make it current.
+        """
+        with self._lock:
+            source = self.source()
+            snapshot = self._load(source)
+            if self.current is not None:
+                self.reloads += 1
+            self.current = snapshot
+            self._seen = (source, snapshot.mtime)
+            self.last_error = None
+        return snapshot
+
+    def ensure_loaded(self):
+        if self.current is None:
+            return self.load()
+        return self.current
+
+    def get(self):
+        if self.current is not None:
+            self.hits += 1
+        return self.ensure_loaded()
+
+    def is_stale(self):
+        source = self.source()
+        try:
+            mtime = os.path.getmtime(source)
+        except OSError:
+            return False
+        return (source, mtime) != self._seen
+
+    def reload_if_changed(self):
+        """
+        Reload the model if the file changed. A broken file keeps the
+        previous model serving and records the error.
+        """
+        if not self.is_stale():
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            self.last_error = repr(e)
+            # Do not retry the same broken file on every poll
+            source = self.source()
+            self._seen = (source, os.path.getmtime(source))
+            return False
+        return True
+
+    async def watch(self, run=None):
+        """
+        Poll for changes, reloading through `run(function)` (e.g. the API's
+        bounded executor), else the loop's default thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if run is None:
+                    await loop.run_in_executor(None, self.reload_if_changed)
+                else:
+                    await run(self.reload_if_changed)
+            except Exception:
+                # Executor busy or slow: check again at the next poll
+                continue
+
+    def status(self):
+        model = self.current
+        if model is None:
+            return {"loaded": False, "path": self.source()}
+        return {
+            "loaded": True,
+            "path": model.path,
+            "version": model.version,
+            "loaded_at": model.loaded_at,
+            "load_seconds": model.load_seconds,
+            "fast_inference": model.fast is not None,
+            "artifact": "pipeline" if model.model is not None else "booster",
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "pid": os.getpid(),
+        }
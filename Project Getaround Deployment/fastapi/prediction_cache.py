@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_features(features, mileage_step=0):
+    """
+    Canonical form of a feature dict: numbers as floats, mileage rounded to
+    the nearest `mileage_step` km when set. The prediction is made on this form,
+    so a cached price is the same whichever request filled the cache.
+    """
+    normalized = {}
+    for column, value in features.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        normalized[column] = value
+    if mileage_step and "mileage" in normalized:
+        normalized["mileage"] = float(round(normalized["mileage"] / mileage_step) * mileage_step)
+    return normalized
+
+
+def feature_key(features):
+    """
+    Hash of the normalized features, independent of the key order.
+    """
+    payload = json.dumps(features, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions with a time to live, in front of the model.
+
+    Entries are stored with the model version: when the version changes,
+    entries of the previous model are dropped.
+    """
+
+    backend = None
+    # Lookups do file I/O: keep them off the event loop
+    blocking = False
+
+    def __init__(self, maxsize=10000, ttl=3600.0, mileage_step=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.mileage_step = mileage_step
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        # Lookups and puts the caller skipped because its I/O pool was busy
+        self.skipped = 0
+        self.invalidations = 0
+        self.version = None
+        self._lock = threading.Lock()
+
+    def prepare(self, features):
+        """
+        (key, normalized features) of a feature dict.
+        """
+        normalized = normalize_features(features, self.mileage_step)
+        return feature_key(normalized), normalized
+
+    def check_version(self, version):
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                    self._clear(version)
+                self.version = version
+
+    def get(self, key, version):
+        """
+        Cached prediction for `key` made by model `version`, or None.
+        """
+        self.check_version(version)
+        value = self._get(key, version, time.time())
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, version, value):
+        self.check_version(version)
+        self._put(key, version, value, time.time())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "backend": self.backend,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "mileage_step": self.mileage_step,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "model_version": self.version,
+        }
+
+
+class MemoryPredictionCache(PredictionCache):
+    """
+    Cache local to the worker process.
+    """
+
+    backend = "memory"
+
+    def __init__(self, maxsize=10000, ttl=3600.0, mileage_step=0):
+        super().__init__(maxsize, ttl, mileage_step)
+        self._entries = OrderedDict()
+
+    def _get(self, key, version, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, entry_version, expires_at = entry
+            if entry_version != version or expires_at <= now:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key, version, value, now):
+        with self._lock:
+            self._entries[key] = (value, version, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _clear(self, version):
+        self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SqlitePredictionCache(PredictionCache):
+    """
+    Cache in a local SQLite file, shared by all gunicorn workers of a container.
+    Counters are those of this worker; the entries are common to all of them.
+
+    Lookups only read: entries leave by age, then oldest first (by rowid)
+    past `maxsize`, rather than least recently used. The cache fails open:
+    a locked or broken file counts as a miss or a skipped put, after at most
+    `BUSY_TIMEOUT` seconds of waiting.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    # Puts between two trims of the table to `maxsize` rows
+    TRIM_EVERY = 100
+    # Seconds to wait for another worker's write before giving up
+    BUSY_TIMEOUT = 0.05
+
+    def __init__(self, path, maxsize=10000, ttl=3600.0, mileage_step=0):
+        super().__init__(maxsize, ttl, mileage_step)
+        self.path = path
+        self._local = threading.local()
+        self._puts = 0
+        # Own connection, closed before gunicorn forks the workers
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, version TEXT, value REAL, expires_at REAL)"
+            )
+        finally:
+            db.close()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads, nor between forked processes
+        db, pid = getattr(self._local, "db", (None, None))
+        if db is None or pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = (db, os.getpid())
+        return db
+
+    def _get(self, key, version, now):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM predictions WHERE key = ? AND version = ? AND expires_at > ?",
+                (key, version, now),
+            ).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        return None if row is None else row[0]
+
+    def _put(self, key, version, value, now):
+        try:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO predictions (key, version, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, version, value, now + self.ttl),
+            )
+            self._puts += 1
+            if self._puts % self.TRIM_EVERY == 0:
+                self._trim(db, now)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _trim(self, db, now):
+        removed = db.execute("DELETE FROM predictions WHERE expires_at <= ?", (now,)).rowcount
+        # A replaced entry gets a new rowid, so rowid order is write order
+        removed += db.execute(
+            "DELETE FROM predictions WHERE rowid IN "
+            "(SELECT rowid FROM predictions ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        ).rowcount
+        self.evictions += removed
+
+    def _clear(self, version):
+        try:
+            self._connection().execute("DELETE FROM predictions WHERE version != ?", (version,))
+        except sqlite3.Error:
+            # Entries of the old version are never read (lookups filter on version) and age out
+            self.errors += 1
+
+    def size(self):
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+
+
+def make_prediction_cache(backend, path, maxsize, ttl, mileage_step):
+    """
+    Cache for the `PREDICTION_CACHE` setting: "memory", "sqlite", or None when disabled.
+    """
+    if backend in ("", "0", "off", "none"):
+        return None
+    if backend == "memory":
+        return MemoryPredictionCache(maxsize, ttl, mileage_step)
+    if backend == "sqlite":
+        return SqlitePredictionCache(path, maxsize, ttl, mileage_step)
+    raise ValueError(f"Unknown prediction cache backend: {backend}")
@@ -0,0 +1,250 @@
+"""
+Train the pricing model outside of the notebook.
+
+New rows are appended to the pricing CSV, the fitted preprocessing is
+cached between runs, hyperparameters are searched with successive halving
+on all cores and the number of trees is set by early stopping. Each run
+writes a versioned directory `models/<version>/` (pipeline, compact
+artifact and `metrics.json`) and points `models/LATEST` at it, which the
+API reloads without a rebuild.
+
+commande : python train.py [--new-rows new_rows.csv] [--candidates 60] [--no-promote]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+import xgboost as xgb
+from scipy.stats import randint, uniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.compose import ColumnTransformer
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+
+from dataset import CATEGORICAL_COLUMNS, BOOLEAN_COLUMNS, DTYPES
+from data_cache import source_checksum
+from fast_inference import export_artifact, load_artifact, check_parity
+
+
+TARGET = "rental_price_per_day"
+NUMERIC_FEATURES = ["mileage", "engine_power"]
+CATEGORICAL_FEATURES = CATEGORICAL_COLUMNS + BOOLEAN_COLUMNS
+
+# Around the grid of model.ipynb (max_depth 5-7, learning_rate 0.08-0.12, min_child_weight 4-6)
+PARAM_DISTRIBUTIONS = {
+    "max_depth": randint(4, 9),
+    "learning_rate": uniform(0.05, 0.15),
+    "min_child_weight": randint(2, 9),
+    "subsample": uniform(0.7, 0.3),
+    "colsample_bytree": uniform(0.7, 0.3),
+}
+
+POINTER = "LATEST"
+
+
+def append_rows(csv_path, new_rows_path, chunksize=10000):
+    """
+    Append the rows of `new_rows_path` to the pricing CSV chunk by chunk,
+    continuing its index. Returns the number of rows added.
+
+    Rows are parsed with the dtypes the API reads the CSV with and written to
+    a copy, which replaces the CSV only once every chunk is valid: a bad row
+    raises `ValueError` and leaves the CSV untouched.
+    """
+    columns = pd.read_csv(csv_path, index_col=0, nrows=0).columns.tolist()
+    next_index = int(pd.read_csv(csv_path, usecols=[0]).iloc[:, 0].max()) + 1
+    header = pd.read_csv(new_rows_path, nrows=0).columns
+    missing = set(columns) - set(header)
+    if missing:
+        raise ValueError(f"New rows lack columns: {', '.join(sorted(missing))}")
+
+    temporary = csv_path + ".tmp"
+    shutil.copyfile(csv_path, temporary)
+    added = 0
+    try:
+        chunks = pd.read_csv(new_rows_path, usecols=columns, dtype=DTYPES, chunksize=chunksize)
+        for chunk in chunks:
+            empty = [column for column in CATEGORICAL_COLUMNS if chunk[column].isna().any()]
+            if empty:
+                raise ValueError(f"New rows have missing values in: {', '.join(empty)}")
+            chunk = chunk[columns]
+            chunk.index = pd.RangeIndex(next_index + added, next_index + added + len(chunk))
+            chunk.to_csv(temporary, mode="a", header=False)
+            added += len(chunk)
+        os.replace(temporary, csv_path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return added
+
+
+def known_categories(X):
+    """
+    Sorted categories of each categorical column over the whole dataset, so that
+    a category too rare to land in the train set is still accepted at prediction time.
+    """
+    return [sorted(X[column].unique().tolist()) for column in CATEGORICAL_FEATURES]
+
+
+def make_preprocessor(categories="auto"):
+    return ColumnTransformer(
+        transformers=[
+            ("cat", OneHotEncoder(categories=categories, drop="first", sparse_output=False), CATEGORICAL_FEATURES),
+            ("num", StandardScaler(), NUMERIC_FEATURES),
+        ])
+
+
+def preprocess(X_train, X_test, categories):
+    """
+    Fit the preprocessing on the train set and transform both sets.
+    Cached on disk by `joblib.Memory`, keyed on the content of the sets.
+    """
+    preprocessor = make_preprocessor(categories)
+    return preprocessor, preprocessor.fit_transform(X_train), preprocessor.transform(X_test)
+
+
+def search(X, Y, candidates, n_estimators, random_state):
+    """
+    Randomized search with successive halving on the number of rows, all cores in parallel.
+    Each XGBoost fit is single-threaded so the CV fits do not compete for cores.
+    """
+    searcher = HalvingRandomSearchCV(
+        xgb.XGBRegressor(n_estimators=n_estimators, n_jobs=1),
+        PARAM_DISTRIBUTIONS,
+        n_candidates=candidates,
+        factor=3,
+        cv=5,
+        scoring="r2",
+        n_jobs=-1,
+        random_state=random_state,
+    )
+    searcher.fit(X, Y)
+    return searcher
+
+
+def best_n_estimators(params, X, Y, max_estimators, random_state):
+    """
+    Number of trees chosen by early stopping on a validation split of the train set.
+    """
+    X_fit, X_valid, Y_fit, Y_valid = train_test_split(X, Y, test_size=0.2, random_state=random_state)
+    regressor = xgb.XGBRegressor(**params, n_estimators=max_estimators, early_stopping_rounds=30)
+    regressor.fit(X_fit, Y_fit, eval_set=[(X_valid, Y_valid)], verbose=False)
+    return regressor.best_iteration + 1
+
+
+def scores(Y, prediction):
+    return {
+        "r2": r2_score(Y, prediction),
+        "rmse": float(np.sqrt(mean_squared_error(Y, prediction))),
+        "mae": mean_absolute_error(Y, prediction),
+    }
+
+
+def latest_version(models_dir):
+    try:
+        with open(os.path.join(models_dir, POINTER)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def promote(models_dir, version):
+    """
+    Point `models/LATEST` at `version`, atomically: the API watches this file.
+    """
+    pointer = os.path.join(models_dir, POINTER)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version + "\n")
+    os.replace(pointer + ".tmp", pointer)
+
+
+def train(csv_path, models_dir, cache_dir, candidates, max_estimators, random_state):
+    timings = {}
+    start = time.perf_counter()
+    data = pd.read_csv(csv_path, index_col=0)
+    X = data.drop(TARGET, axis=1)
+    Y = data.loc[:, TARGET]
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+
+    memory = joblib.Memory(cache_dir, verbose=0)
+    preprocessor, X_train_bis, X_test_bis = memory.cache(preprocess)(X_train, X_test, known_categories(X))
+    timings["preprocess"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    searcher = search(X_train_bis, Y_train, candidates, max_estimators // 2, random_state)
+    params = searcher.best_params_
+    timings["search"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_estimators = best_n_estimators(params, X_train_bis, Y_train, max_estimators, random_state)
+    # Refit on the whole train set without early stopping, so the booster holds exactly
+    # the trees it predicts with (the compact artifact uses all trees of the booster)
+    regressor = xgb.XGBRegressor(**params, n_estimators=n_estimators)
+    regressor.fit(X_train_bis, Y_train)
+    model = Pipeline(steps=[
+        ("Preprocessing", preprocessor),
+        ("Regressor", regressor)
+    ])
+    timings["refit"] = time.perf_counter() - start
+
+    # Suffixed so that two runs started in the same second do not collide
+    version = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    directory = os.path.join(models_dir, version)
+    os.makedirs(directory)
+    joblib.dump(model, os.path.join(directory, "model.joblib"))
+    artifact = export_artifact(model, os.path.join(directory, "model.ubj"))
+    mismatches, max_difference = check_parity(model, csv_path, predictor=load_artifact(artifact))
+
+    metrics = {
+        "version": version,
+        "trained_at": time.time(),
+        "data": {"path": csv_path, "checksum": source_checksum(csv_path), "rows": len(data), "train_rows": len(X_train)},
+        "params": {**{k: v.item() if hasattr(v, "item") else v for k, v in params.items()}, "n_estimators": n_estimators},
+        "search": {"candidates": candidates, "best_cv_r2": float(searcher.best_score_), "iterations": int(searcher.n_iterations_)},
+        "train": scores(Y_train, model.predict(X_train)),
+        "test": scores(Y_test, model.predict(X_test)),
+        "parity": {"max_difference": max_difference, "rows_over_tolerance": len(mismatches)},
+        "timings": timings,
+        "versions": {"xgboost": xgb.__version__, "python": sys.version.split()[0]},
+    }
+    with open(os.path.join(directory, "metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2)
+    return version, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default="get_around_pricing_project.csv")
+    parser.add_argument("--new-rows", help="CSV of new pricing rows to append to --csv before training")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--cache-dir", default=".train_cache", help="joblib.Memory cache of the preprocessing")
+    parser.add_argument("--candidates", type=int, default=60, help="hyperparameter sets of the first halving iteration")
+    parser.add_argument("--max-estimators", type=int, default=1000, help="upper bound of the early stopping")
+    parser.add_argument("--random-state", type=int, default=0)
+    parser.add_argument("--no-promote", action="store_true", help="do not point models/LATEST at the new version")
+    args = parser.parse_args()
+
+    if args.new_rows:
+        print(f"{append_rows(args.csv, args.new_rows)} rows added to {args.csv}")
+    previous = latest_version(args.models_dir)
+    version, metrics = train(args.csv, args.models_dir, args.cache_dir, args.candidates, args.max_estimators, args.random_state)
+    print(json.dumps({k: metrics[k] for k in ("version", "params", "train", "test", "parity", "timings")}, indent=2))
+
+    if metrics["parity"]["rows_over_tolerance"]:
+        print("Compact artifact does not predict like the pipeline, not promoted")
+        sys.exit(1)
+    if not args.no_promote:
+        promote(args.models_dir, version)
+        print(f"{args.models_dir}/{POINTER}: {previous} -> {version}")
+
+
+if __name__ == "__main__":
+    main()
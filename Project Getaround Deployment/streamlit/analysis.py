@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+
+
+# Upper edges (in minutes) of the delay buckets shown in the dashboard
+DELAY_EDGES = (30, 60, 120, 240)
+
+
+def duration_label(minutes):
+    if minutes % 60 == 0:
+        return f"{minutes // 60}h"
+    return f"{minutes}min"
+
+
+def delay_labels(edges=DELAY_EDGES):
+    """
+    ['on time', 'late -30min', 'late -1h', 'late -2h', 'late -4h', 'late +4h', 'NA'] for the default edges.
+    """
+    return (
+        ["on time"]
+        + [f"late -{duration_label(edge)}" for edge in edges]
+        + [f"late +{duration_label(edges[-1])}", "NA"]
+    )
+
+
+def lateness(minutes):
+    """
+    'on time' for delays <= 0, 'late' for positive delays, 'NA' when unknown.
+    """
+    values = np.asarray(minutes, dtype=float)
+    codes = (values > 0).astype(np.int8)
+    codes[np.isnan(values)] = 2
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=["on time", "late", "NA"]),
+        index=getattr(minutes, "index", None),
+    )
+
+
+def delay_bucket(minutes, edges=DELAY_EDGES):
+    """
+    Bucket of each delay: 'on time' below 0, then one bucket per edge
+    (`[0, 30)`, `[30, 60)`, ...), one for delays above the last edge, and 'NA' when unknown.
+    """
+    values = np.asarray(minutes, dtype=float)
+    codes = np.searchsorted(np.array([0, *edges], dtype=float), values, side="right")
+    codes[np.isnan(values)] = len(edges) + 2
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=delay_labels(edges)),
+        index=getattr(minutes, "index", None),
+    )
+
+
+def enough_delta(delta):
+    """
+    'yes' when the time delta with the previous rental covers its delay.
+    """
+    return pd.Series(
+        pd.Categorical.from_codes((np.asarray(delta, dtype=float) >= 0).astype(np.int8), categories=["no", "yes"]),
+        index=getattr(delta, "index", None),
+    )
+
+
+# Pure analysis steps of the dashboard, cached by app.py per dataset version
+
+def add_delay_columns(data, edges=DELAY_EDGES):
+    data = data.copy()
+    data['late'] = lateness(data['delay_at_checkout_in_minutes'])
+    data['delay'] = delay_bucket(data['delay_at_checkout_in_minutes'], edges)
+    return data
+
+
+def overview(data):
+    canceled = int((data['state'] == 'canceled').sum())
+    return {
+        "avg_delay": data['delay_at_checkout_in_minutes'].mean(),
+        "med_delay": data['delay_at_checkout_in_minutes'].median(),
+        "nb_mobile": int((data['checkin_type'] == 'mobile').sum()),
+        "nb_canceled": canceled,
+        "canceled_share": canceled / len(data),
+    }
+
+
+def canceled_with_previous(data):
+    """
+    Canceled rentals joined with their previous rental (`_x`: canceled one, `_y`: previous one).
+    """
+    cancel = data[data['state'] == 'canceled'].dropna(subset=['previous_ended_rental_id'])
+    return cancel.merge(data, left_on='previous_ended_rental_id', right_on='rental_id')
+
+
+def late_drivers(data):
+    """
+    Positive delays, without outliers above mean + 3 std.
+    """
+    df = data.dropna(subset=['delay_at_checkout_in_minutes'])
+    mean = df['delay_at_checkout_in_minutes'].mean()
+    std = df['delay_at_checkout_in_minutes'].std()
+    return df[((df['delay_at_checkout_in_minutes'] < (mean + 3 * std)) & (df['delay_at_checkout_in_minutes'] > 0))]
+
+
+def delta_frame(data):
+    """
+    Rentals with both a delay and a time delta with the previous rental.
+    """
+    delta = data.dropna(subset=['delay_at_checkout_in_minutes', 'time_delta_with_previous_rental_in_minutes']).copy()
+    delta['delta'] = delta['time_delta_with_previous_rental_in_minutes'] - delta['delay_at_checkout_in_minutes']
+    delta['enough_delta'] = enough_delta(delta['delta'])
+    return delta
+
+
+def delta_summary(delta):
+    not_enough = delta[delta['enough_delta'] == 'no']
+    mobile = not_enough[not_enough['checkin_type'] == 'mobile']
+    connect = not_enough[not_enough['checkin_type'] == 'connect']
+    return {
+        "yes_mean": delta[delta['enough_delta'] == 'yes']['time_delta_with_previous_rental_in_minutes'].mean(),
+        "no_mobile_mean": mobile['time_delta_with_previous_rental_in_minutes'].mean(),
+        "no_mobile_delta_mean": mobile['delta'].mean(),
+        "no_connect_mean": connect['time_delta_with_previous_rental_in_minutes'].mean(),
+        "no_connect_delta_mean": connect['delta'].mean(),
+    }
+
+
+def late_drivers_summary(late_drivers):
+    delays = late_drivers['delay_at_checkout_in_minutes']
+    mobile = delays[late_drivers['checkin_type'] == 'mobile']
+    connect = delays[late_drivers['checkin_type'] == 'connect']
+    return {
+        "global_median": delays.median(),
+        "mobile_median": mobile.median(),
+        "connect_median": connect.median(),
+        "global_mean": delays.mean(),
+        "mobile_mean": mobile.mean(),
+        "connect_mean": connect.mean(),
+        "nb_mobile": len(mobile),
+        "nb_connect": len(connect),
+    }
+
+
+def money_loss(late_summary, cancel, mean_price_per_day, rental_hours=6):
+    """
+    Revenue lost to delays per checkin type, and to cancelations following a late
+    rental, assuming an average rental of `rental_hours`.
+    """
+    mean_price_per_min = mean_price_per_day / 24 / 60
+    connect = late_summary["nb_connect"] * late_summary["connect_mean"] * mean_price_per_min
+    mobile = late_summary["nb_mobile"] * late_summary["mobile_mean"] * mean_price_per_min
+    canceled = rental_hours * (mean_price_per_min * 60) * int((cancel['late_y'] == 'late').sum())
+    return {
+        "connect": connect,
+        "mobile": mobile,
+        "cancel": canceled,
+        "total": connect + mobile + canceled,
+    }
+
+
+# Threshold simulation
+
+SCOPES = {"All cars": None, "Connect only": "connect", "Mobile only": "mobile"}
+
+
+class RentalChainIndex:
+    """
+    Each rental with a previous rental on the same car, linked to it once:
+    sorted time deltas with the previous rental, and running counts of the
+    rentals that were problematic (previous driver later than the time delta)
+    and of the rentals that ended (revenue), per scope.
+
+    Any threshold is then answered with a `searchsorted` on the sorted deltas,
+    without merging the rentals again.
+    """
+
+    def __init__(self, data):
+        rental_ids = data['rental_id'].to_numpy()
+        order = np.argsort(rental_ids)
+        sorted_ids = rental_ids[order]
+        delays = data['delay_at_checkout_in_minutes'].to_numpy(dtype=float)
+
+        chained = data.dropna(subset=['previous_ended_rental_id', 'time_delta_with_previous_rental_in_minutes'])
+        previous_ids = chained['previous_ended_rental_id'].to_numpy().astype(rental_ids.dtype)
+        positions = np.minimum(np.searchsorted(sorted_ids, previous_ids), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == previous_ids
+        self.previous_delay = np.where(found, delays[order[positions]], np.nan)
+        self.time_delta = chained['time_delta_with_previous_rental_in_minutes'].to_numpy(dtype=float)
+        problematic = self.previous_delay > self.time_delta
+        ended = (chained['state'] == 'ended').to_numpy()
+        checkin_type = chained['checkin_type'].to_numpy()
+
+        self.scopes = {}
+        for scope, kind in SCOPES.items():
+            all_in_scope = data['checkin_type'] == kind if kind else pd.Series(True, index=data.index)
+            in_scope = np.ones(len(chained), dtype=bool) if kind is None else checkin_type == kind
+            by_delta = np.argsort(self.time_delta[in_scope], kind="stable")
+            self.scopes[scope] = {
+                "rentals": int(all_in_scope.sum()),
+                "ended_rentals": int((all_in_scope & (data['state'] == 'ended')).sum()),
+                "time_delta": self.time_delta[in_scope][by_delta],
+                "problematic": np.concatenate([[0], np.cumsum(problematic[in_scope][by_delta])]),
+                "ended": np.concatenate([[0], np.cumsum(ended[in_scope][by_delta])]),
+            }
+
+    def simulate(self, thresholds, scope="All cars"):
+        """
+        For each threshold (minutes): rentals that would be blocked because they start less than
+        `threshold` after the previous one, how many of them ended (lost revenue), and how many
+        problematic cases they account for. Vectorized over `thresholds`.
+        """
+        index = self.scopes[scope]
+        blocked = np.searchsorted(index["time_delta"], np.asarray(thresholds, dtype=float), side="left")
+        problematic_total = int(index["problematic"][-1])
+        return pd.DataFrame({
+            "threshold": thresholds,
+            "blocked": blocked,
+            "blocked_share": blocked / index["rentals"],
+            "blocked_ended": index["ended"][blocked],
+            "revenue_share": index["ended"][blocked] / index["ended_rentals"],
+            "solved": index["problematic"][blocked],
+            "solved_share": index["problematic"][blocked] / problematic_total if problematic_total else 0.0,
+        })
+
+
+# Chart aggregates: charts get one row per bin and group instead of one row per rental
+
+def count_by(data, x, color=None, percent=False, sort=False):
+    """
+    Number of rows per `x` (and `color`) value, in order of first appearance like plotly does
+    (or in sorted order with `sort`).
+    With `percent`, counts are normalized within each `color` group, like `histnorm="percent"`.
+    """
+    by = [x] if color is None else [x, color]
+    counts = data.groupby(by, sort=sort, observed=True).size().reset_index(name="count")
+    if percent:
+        total = counts.groupby(color, sort=False, observed=True)["count"].transform("sum") if color else counts["count"].sum()
+        counts["percent"] = counts["count"] / total * 100
+    # Plain values, plotly does not need the categories of the source frame
+    for column in by:
+        counts[column] = counts[column].astype(str)
+    return counts
+
+
+def histogram_bins(values, nbins):
+    """
+    Counts of `values` in `nbins` equal-width bins, with bin centers and widths for a bar chart.
+    """
+    counts, edges = np.histogram(np.asarray(values, dtype=float), bins=max(int(nbins), 1))
+    return pd.DataFrame({
+        "center": (edges[:-1] + edges[1:]) / 2,
+        "width": np.diff(edges),
+        "count": counts,
+    })
+
+
+def chart_data(data, cancel, late_drivers, delta):
+    """
+    Everything the dashboard charts need, aggregated per bin and group.
+    """
+    known = data[data['late'] != 'NA']
+    late = data[(data['delay'] != 'NA') & (data['delay'] != 'on time')]
+    return {
+        "late": count_by(known, "late"),
+        "checkin_type": count_by(data, "checkin_type"),
+        "state": count_by(data, "state"),
+        "late_by_checkin_type": count_by(known, "late", "checkin_type", percent=True),
+        # Delay buckets are categories in delay order
+        "delay": count_by(late, "delay", sort=True),
+        "delay_by_checkin_type": count_by(late, "delay", "checkin_type", sort=True),
+        # Facet order of the former row-level chart (first appearance by increasing delay)
+        "delay_checkin_type_order": pd.unique(late.sort_values(by="delay_at_checkout_in_minutes")['checkin_type'].astype(str)).tolist(),
+        "state_by_checkin_type": count_by(data, "state", "checkin_type", percent=True),
+        "cancel_previous_late": count_by(cancel[cancel['late_y'] != 'NA'], "late_y", "checkin_type_y"),
+        "late_drivers_delay": histogram_bins(late_drivers['delay_at_checkout_in_minutes'], len(late_drivers) / 10),
+        "enough_delta": count_by(delta, "enough_delta", "checkin_type"),
+    }
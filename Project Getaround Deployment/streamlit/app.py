@@ -4,6 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 
+import analysis
+from data_cache import load_cached, read_delay_analysis, source_checksum
+
 
 ### Config
 st.set_page_config(
@@ -21,22 +24,64 @@ st.markdown("Enjoy this simple web dashboard.")
 st.markdown("Check out our data here ⬇️")
 
 ### Import data
-@st.cache(allow_output_mutation=True)
-def load_data():
-    data = pd.read_excel("get_around_delay_analysis.xlsx")
-    data['late'] = data['delay_at_checkout_in_minutes'].apply(lambda x : "on time" if x <= 0 else 'late' if x > 0 else 'NA')
-    data['delay'] = data['delay_at_checkout_in_minutes'].apply(lambda x : "on time" if x < 0 else 'late -30min' if x < 30 
-                                                            else 'late -1h' if x < 60 else 'late -2h' if x < 120
-                                                            else 'late -4h' if x < 240 else 'late +4h' if x>= 240 else 'NA')
-    return data
-
-def load_price():
-    price = pd.read_csv("get_around_pricing_project.csv")
-    return price
+# Everything below is cached per dataset version (checksum of the source file),
+# so a rerun triggered by a widget only renders and never recomputes.
+@st.cache_data
+def load_data(version):
+    # Typed Parquet copy of the workbook, rebuilt when the workbook changes
+    data = load_cached("get_around_delay_analysis.xlsx", read_delay_analysis)
+    return analysis.add_delay_columns(data, analysis.DELAY_EDGES)
+
+@st.cache_data
+def load_price(version):
+    price = load_cached("get_around_pricing_project.csv", pd.read_csv)
+    return price['rental_price_per_day'].mean()
+
+# Arguments starting with _ are not hashed: results are keyed on version only
+@st.cache_data
+def get_overview(_data, version):
+    return analysis.overview(_data)
+
+@st.cache_data
+def get_cancel(_data, version):
+    return analysis.canceled_with_previous(_data)
+
+@st.cache_data
+def get_late_drivers(_data, version):
+    return analysis.late_drivers(_data)
+
+@st.cache_data
+def get_late_drivers_summary(_late_drivers, version):
+    return analysis.late_drivers_summary(_late_drivers)
+
+@st.cache_data
+def get_delta(_data, version):
+    delta = analysis.delta_frame(_data)
+    return delta, analysis.delta_summary(delta)
+
+@st.cache_data
+def get_chart_data(_data, _cancel, _late_drivers, _delta, version):
+    # Charts get counts per bin instead of every row, so the page weight does not grow with the data
+    return analysis.chart_data(_data, _cancel, _late_drivers, _delta)
+
+@st.cache_data
+def get_money_loss(_late_summary, _cancel, mean_price_per_day, version):
+    return analysis.money_loss(_late_summary, _cancel, mean_price_per_day)
+
+# Read-only index shared by all sessions, not copied on every rerun
+@st.cache_resource
+def get_rental_chain_index(_data, version):
+    return analysis.RentalChainIndex(_data)
 
 data_load_state = st.text('Loading data...')
-data = load_data()
-price = load_price()
+version = source_checksum("get_around_delay_analysis.xlsx")
+data = load_data(version)
+mean_price_per_day = load_price(source_checksum("get_around_pricing_project.csv"))
+summary = get_overview(data, version)
+cancel = get_cancel(data, version)
+late_drivers = get_late_drivers(data, version)
+delta, delta_summary = get_delta(data, version)
+charts = get_chart_data(data, cancel, late_drivers, delta, version)
 
 ## Run the below code if the check is checked ✅
 if st.checkbox('Show raw data'):
@@ -46,14 +91,14 @@ if st.checkbox('Show raw data'):
 ## Header
 st.header("First analysis")
 st.subheader("Delays proportion")
-avg_delay = data['delay_at_checkout_in_minutes'].mean()
-med_delay = data['delay_at_checkout_in_minutes'].median()
+avg_delay = summary["avg_delay"]
+med_delay = summary["med_delay"]
 
 #### CREATE TWO COLUMNS
 col1, col2, col3 = st.columns(3)
 
 with col1:
-        fig = px.pie(data[data['late'] != 'NA'], names="late")
+        fig = px.pie(charts["late"], names="late", values="count")
         st.plotly_chart(fig, use_container_width=True)
         st.markdown(f"There are more users coming late than on time.\
         It can be problematic for the next user taking a car, and for client satisfaction of Getaround.\
@@ -61,15 +106,15 @@ with col1:
 
 with col2:
         st.subheader("Types proportion")
-        fig = px.pie(data,names="checkin_type")
+        fig = px.pie(charts["checkin_type"], names="checkin_type", values="count")
         st.plotly_chart(fig, use_container_width=True)
-        st.markdown(f"The biggest part of checkin is on mobile. It represents {len(data[data['checkin_type'] == 'mobile'])} reservations.")
+        st.markdown(f"The biggest part of checkin is on mobile. It represents {summary['nb_mobile']} reservations.")
     
 with col3:
         st.subheader("State proportion")
-        fig = px.pie(data,names="state")
+        fig = px.pie(charts["state"], names="state", values="count")
         st.plotly_chart(fig, use_container_width=True)
-        st.markdown(f"{round(len(data[data['state'] == 'canceled']) / len(data), 2)} percent of reservation are canceled. It represents {len(data[data['state'] == 'canceled'])} reservations. \
+        st.markdown(f"{round(summary['canceled_share'], 2)} percent of reservation are canceled. It represents {summary['nb_canceled']} reservations. \
             Is it due to delay of previous users?")
 
 
@@ -77,8 +122,8 @@ st.header("Delays")
 
 st.subheader("Being late by checkin type")
 st.markdown("Let's see if users are late in function of checkin type.")
-fig = px.histogram(data[data['late'] != 'NA'], x="late", color="checkin_type", barmode = "group",
-                    width = 700, height = 500, histnorm = "percent", text_auto = True)
+fig = px.bar(charts["late_by_checkin_type"], x="late", y="percent", color="checkin_type", barmode = "group",
+                    width = 700, height = 500, text_auto = True)
 fig.update_traces(textposition = "outside")
 st.plotly_chart(fig, use_container_width=True)
 st.markdown("60 percent of mobile checkin are late whereas 40 percent for connect checkin.\
@@ -90,16 +135,15 @@ with col1:
     st.subheader("Delays distribution")
     color_discrete_sequence = ["green", "yellow", "orange", "red", "black"]
     st.markdown("Let's see how much are the users late.")
-    fig = px.histogram(data[((data['delay'] != 'NA') & (data['delay'] != 'on time'))].sort_values(by="delay_at_checkout_in_minutes"),
-                        x="delay", color="delay", color_discrete_sequence=color_discrete_sequence)
+    fig = px.bar(charts["delay"], x="delay", y="count", color="delay", color_discrete_sequence=color_discrete_sequence)
     st.plotly_chart(fig, use_container_width=True)
     st.markdown("Biggest part of delay are under 2h. It's perhaps at 2h that should be the threshold")
 
 with col2:
     st.subheader("Delays distribution per checkin type")
     st.markdown("Let's see how much are the users late in function of checkin type.")
-    fig = px.histogram(data[((data['delay'] != 'NA') & (data['delay'] != 'on time'))].sort_values(by="delay_at_checkout_in_minutes"),
-                        x="delay", color="delay", facet_row="checkin_type", color_discrete_sequence=color_discrete_sequence)
+    fig = px.bar(charts["delay_by_checkin_type"], x="delay", y="count", color="delay", facet_row="checkin_type",
+                        category_orders={"checkin_type": charts["delay_checkin_type_order"]}, color_discrete_sequence=color_discrete_sequence)
     st.plotly_chart(fig, use_container_width=True)
     st.markdown("Mobile checkin type is more concerned by delays. For both checkin type, biggest part of delays is for less than 2h.")
 
@@ -111,8 +155,8 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("State by checkin type")
     st.markdown("Let's see the proportion of canceled car in function of checkin type.")
-    fig = px.histogram(data, x = "state", color = "checkin_type", barmode ="group",
-                        width= 700, height = 500, histnorm = "percent", text_auto = True)
+    fig = px.bar(charts["state_by_checkin_type"], x = "state", y = "percent", color = "checkin_type", barmode ="group",
+                        width= 700, height = 500, text_auto = True)
     fig.update_traces(textposition = "outside")
     st.plotly_chart(fig, use_container_width=True)
     st.markdown("It seems a big part of cancelation is from connect checkin type.")
@@ -120,10 +164,7 @@ with col1:
 with col2:
     st.subheader("Checkin type and delay of previous car when canceled")
     st.markdown("Let's see, when a car is canceled, what was the checkin type of the previous customer and if he was late.")
-    cancel = data[data['state'] == 'canceled']
-    cancel.dropna(subset=['previous_ended_rental_id'], inplace=True)
-    cancel = cancel.merge(data, left_on='previous_ended_rental_id', right_on='rental_id')
-    fig = px.histogram(cancel[cancel['late_y'] != 'NA'], x = "late_y", color = "checkin_type_y",
+    fig = px.bar(charts["cancel_previous_late"], x = "late_y", y = "count", color = "checkin_type_y",
                         barmode ="group", width= 700, height = 500, text_auto = True)
     fig.update_traces(textposition = "outside")
     st.plotly_chart(fig, use_container_width=True)
@@ -138,30 +179,22 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("Threshold")
     st.markdown("Let's remove outlier and keep only positive delays to visualize the distribution of delays and estimate a threshold.")
-    df = data.copy()
-    df.dropna(subset=['delay_at_checkout_in_minutes'], inplace=True)
-    mean = df['delay_at_checkout_in_minutes'].mean()
-    std = df['delay_at_checkout_in_minutes'].std()
-    late_drivers = df[((df['delay_at_checkout_in_minutes'] < (mean + 3 * std)) & (df['delay_at_checkout_in_minutes'] > 0))]
-    fig = px.histogram(late_drivers, x="delay_at_checkout_in_minutes", histfunc='count',
-                        nbins=(int(len(late_drivers['delay_at_checkout_in_minutes'])/10)))
+    bins = charts["late_drivers_delay"]
+    fig = px.bar(bins, x="center", y="count", labels={"center": "delay_at_checkout_in_minutes"})
+    fig.update_traces(width=bins["width"])
     st.plotly_chart(fig, use_container_width=True)
     st.markdown("Most of delays are under 2h. \
         Let's see difference between time delta recorded and delay per checkin type.")
 
-delta = df.dropna(subset='time_delta_with_previous_rental_in_minutes')
-delta = delta.dropna(subset='delay_at_checkout_in_minutes')
-delta['delta'] = delta['time_delta_with_previous_rental_in_minutes'] - delta['delay_at_checkout_in_minutes']
-delta['enough_delta'] = delta['delta'].apply(lambda x: 'yes' if x >=0 else 'no')
-yes_mean = delta[delta['enough_delta'] == 'yes']['time_delta_with_previous_rental_in_minutes'].mean()
-no_mobile_mean = delta[(delta['enough_delta'] == "no") & (delta['checkin_type'] == "mobile")]['time_delta_with_previous_rental_in_minutes'].mean()
-no_mobile_delta_mean = delta[(delta['enough_delta'] == "no") & (delta['checkin_type'] == "mobile")]['delta'].mean()
-no_connect_mean = delta[(delta['enough_delta'] == "no") & (delta['checkin_type'] == "connect")]['time_delta_with_previous_rental_in_minutes'].mean()
-no_connect_delta_mean = delta[(delta['enough_delta'] == "no") & (delta['checkin_type'] == "connect")]['delta'].mean()
+yes_mean = delta_summary["yes_mean"]
+no_mobile_mean = delta_summary["no_mobile_mean"]
+no_mobile_delta_mean = delta_summary["no_mobile_delta_mean"]
+no_connect_mean = delta_summary["no_connect_mean"]
+no_connect_delta_mean = delta_summary["no_connect_delta_mean"]
 
 with col2:
 
-    fig = px.histogram(delta, x="enough_delta", color="checkin_type", barmode = "group")
+    fig = px.bar(charts["enough_delta"], x="enough_delta", y="count", color="checkin_type", barmode = "group")
     st.plotly_chart(fig, use_container_width=True)
     st.markdown(f"We can see that most the car had enough time delta with the next when we have a time delta with previous rental car recorded.\
             Median delay for cars when they have enough time delta is {round(yes_mean, 2)} minutes.\
@@ -173,12 +206,10 @@ with col2:
 st.markdown("To apply a threshold, as we said previouly, we should focus on mobile checkin type. \
         I choose to take the median of late drivers, what is more relevent than mean that can be biased with outliers.")
 
-global_median = late_drivers['delay_at_checkout_in_minutes'].median()
-mobile_median =  late_drivers[late_drivers['checkin_type'] == 'mobile']['delay_at_checkout_in_minutes'].median()
-connect_median = late_drivers[late_drivers['checkin_type'] == 'connect']['delay_at_checkout_in_minutes'].median()
-global_mean = late_drivers['delay_at_checkout_in_minutes'].mean()
-mobile_mean =  late_drivers[late_drivers['checkin_type'] == 'mobile']['delay_at_checkout_in_minutes'].mean()
-connect_mean = late_drivers[late_drivers['checkin_type'] == 'connect']['delay_at_checkout_in_minutes'].mean()
+late_summary = get_late_drivers_summary(late_drivers, version)
+global_median = late_summary["global_median"]
+mobile_median = late_summary["mobile_median"]
+connect_median = late_summary["connect_median"]
 st.markdown(f"Global median is {global_median} minutes.")
 st.markdown(f"Median for connect checkin is {connect_median} minutes.")
 st.markdown(f"Median for mobile checkin is {mobile_median} minutes, and it is the threshold we should apply.")
@@ -186,30 +217,56 @@ st.markdown(f"Median for mobile checkin is {mobile_median} minutes, and it is th
 
 st.header("Money loss")
 
-mean_price_per_min = (price['rental_price_per_day'].mean() / 24 / 60)
+money_loss = get_money_loss(late_summary, cancel, mean_price_per_day, version)
 
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("Let's see how much money we should loss if we apply a threshold for connect ckeckin.")
-    nb_connect = len(late_drivers[late_drivers['checkin_type'] == 'connect'])
-    connect_money_loss = nb_connect * connect_mean * mean_price_per_min
-    st.markdown(f"For connect checkin, the money loss is about {round(connect_money_loss, 2)} $ for {nb_connect} delays concerned.")
+    st.markdown(f"For connect checkin, the money loss is about {round(money_loss['connect'], 2)} $ for {late_summary['nb_connect']} delays concerned.")
 
 with col2:
     st.markdown("Let's see how much money we should loss if we apply a threshold for mobile ckeckin.")
-    nb_mobile = len(late_drivers[late_drivers['checkin_type'] == 'mobile'])
-    mobile_money_loss = nb_mobile * mobile_mean * mean_price_per_min
-    st.markdown(f"For mobile checkin, the money loss is about {round(mobile_money_loss, 2)} $ for {nb_mobile} delays concerned.")
-
-cancel_money_loss = 6 * (mean_price_per_min *60) * len(cancel[cancel['late_y'] == 'late'])
+    st.markdown(f"For mobile checkin, the money loss is about {round(money_loss['mobile'], 2)} $ for {late_summary['nb_mobile']} delays concerned.")
 
 st.subheader("Hypothetic global money loss")
 st.markdown(f"To have the exact money loss, it should be good to have the information about location duration. \
         We should be able to estimate the money loss for cancelation due to delays to add to money loss due to delays.\
         If we imagine to have a 6h average location duration, and suppose that all canceled reservation with a previous car late are due to delays,\
-        we have to add a money loss of {round(cancel_money_loss, 2)} $ for cancelation.")
-st.markdown(f"If we estimate the global money loss without threshold, it is aroud {round(connect_money_loss + mobile_money_loss + cancel_money_loss,2)} $ of loss.")
+        we have to add a money loss of {round(money_loss['cancel'], 2)} $ for cancelation.")
+st.markdown(f"If we estimate the global money loss without threshold, it is aroud {round(money_loss['total'],2)} $ of loss.")
+
+
+st.header("Threshold simulator")
+st.markdown("Choose a minimum delay between two rentals and the cars it applies to, \
+    to see how many rentals it blocks, what it costs and how many problematic cases it solves. \
+    A case is problematic when the previous driver came back later than the time delta between the two rentals.")
+
+chain_index = get_rental_chain_index(data, version)
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    threshold = st.slider("Minimum delay between two rentals (minutes)", 0, 720, 120, step=15)
+with col2:
+    scope = st.radio("Scope", list(analysis.SCOPES))
+with col3:
+    rental_hours = st.number_input("Average rental duration (hours)", min_value=1, max_value=72, value=6)
+
+result = chain_index.simulate([threshold], scope).iloc[0]
+revenue_per_rental = mean_price_per_day * rental_hours / 24
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Blocked rentals", int(result['blocked']), f"{result['blocked_share']:.1%} of rentals in scope", delta_color="off")
+col2.metric("Revenue at stake", f"{round(result['blocked_ended'] * revenue_per_rental, 2)} $", f"{result['revenue_share']:.1%} of revenue in scope", delta_color="off")
+col3.metric("Problematic cases solved", int(result['solved']), f"{result['solved_share']:.1%} of problematic cases", delta_color="off")
+
+curve = chain_index.simulate(np.arange(0, 721, 15), scope)
+fig = go.Figure()
+fig.add_trace(go.Scatter(x=curve['threshold'], y=curve['blocked_share'] * 100, name="Blocked rentals (%)"))
+fig.add_trace(go.Scatter(x=curve['threshold'], y=curve['solved_share'] * 100, name="Problematic cases solved (%)"))
+fig.add_vline(x=threshold, line_dash="dash")
+fig.update_layout(xaxis_title="Threshold (minutes)", yaxis_title="Percent")
+st.plotly_chart(fig, use_container_width=True)
 
 
 
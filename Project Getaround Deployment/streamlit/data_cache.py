@@ -0,0 +1,86 @@
+"""
+Parquet cache of the source files of the dashboard.
+
+Mirrors `fastapi/data_cache.py` (the two apps are separate Docker build
+contexts and cannot share it): keep both in sync.
+"""
+import os
+import json
+import hashlib
+import pandas as pd
+
+
+def read_delay_analysis(path):
+    data = pd.read_excel(path)
+    return data.astype({"checkin_type": "category", "state": "category"})
+
+
+def source_checksum(*paths):
+    """
+    SHA-256 of the content of the file(s), read by chunks.
+    """
+    sha = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cache_paths(source):
+    """
+    Parquet file and its metadata (checksum of the source it was built from), next to the source.
+    """
+    cache = f"{source}.parquet"
+    return cache, f"{cache}.json"
+
+
+def build_cache(source, reader, checksum=None):
+    """
+    Read `source` with `reader` and write it as a typed Parquet file.
+    """
+    checksum = checksum or source_checksum(source)
+    data = reader(source)
+    cache, meta = cache_paths(source)
+    # Write then rename, so concurrent workers never read a partial file
+    tmp = f"{cache}.{os.getpid()}.tmp"
+    data.to_parquet(tmp)
+    os.replace(tmp, cache)
+    with open(f"{meta}.{os.getpid()}.tmp", "w") as f:
+        json.dump({"source": os.path.basename(source), "sha256": checksum}, f)
+    os.replace(f"{meta}.{os.getpid()}.tmp", meta)
+    return data
+
+
+def is_fresh(source, checksum):
+    cache, meta = cache_paths(source)
+    try:
+        with open(meta) as f:
+            return json.load(f)["sha256"] == checksum and os.path.exists(cache)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_cached(source, reader):
+    """
+    Load `source` from its Parquet cache when the cache was built from the
+    same file content, otherwise read the source and rebuild the cache.
+    Falls back to the source when pyarrow is missing or the directory is read-only.
+    """
+    checksum = source_checksum(source)
+    if is_fresh(source, checksum):
+        try:
+            return pd.read_parquet(cache_paths(source)[0])
+        except (ImportError, OSError, ValueError):
+            pass
+    try:
+        return build_cache(source, reader, checksum)
+    except (ImportError, OSError):
+        return reader(source)
+
+
+if __name__ == "__main__":
+    # commande : python data_cache.py
+    build_cache("get_around_delay_analysis.xlsx", read_delay_analysis)
+    build_cache("get_around_pricing_project.csv", pd.read_csv)
+    print("cache built")